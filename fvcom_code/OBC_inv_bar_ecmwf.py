@@ -6,11 +6,7 @@
 
 from fvcom_tools_packages.fvcom_prep import FvcomPrep
 from fvcom_tools_packages.read_data import ReadData
-from fvcom_tools_packages.fvcom_grid import Grid
-import numpy as np
-from scipy.interpolate import interp1d, griddata
 import os
-from matplotlib.dates import num2date
 # ecmwf数据准备
 ecmwf_slp_dir = r'E:\ecmwf\press\1993'
 ecmwf_slp_files = os.listdir(ecmwf_slp_dir)
@@ -18,38 +14,17 @@ select_ecmwf_slp_path = [os.path.join(ecmwf_slp_dir, x) for x in ecmwf_slp_files
 ecmwf_slp_data = ReadData(select_ecmwf_slp_path, types='ecmwf',
                           variables=['lon', 'lat', 'time', 'slp'],
                           extents=[105, 135, 5, 40])
-# obc文件
+# obc文件（不设置types，逐块读取）
 obc_nc_path = r'H:\fvcom\fvcom_input_file\julian_obc_all.nc'
-obc_data = ReadData(obc_nc_path, types='obc',
-                    variables=['obc', 'elev'])
-obc_num = len(obc_data.data.obc)
+obc_data = ReadData(obc_nc_path, variables=['obc', 'elev'])
 # 网格文件
 sms_path = r'H:\fvcom\fvcom_input_file\sms.2dm'
-sms_data = Grid(sms_path)
-# obc的经纬度
-obc_lat = sms_data.lat[0:obc_num]
-obc_lon = sms_data.lon[0:obc_num]
+prep = FvcomPrep(sms_path, weight_dir=r'H:\fvcom\weights')  # 插值权重保存在硬盘，重复运行时直接读取
 
-# 气压空间方向插值
-LON, LAT = np.meshgrid(ecmwf_slp_data.data.lon, ecmwf_slp_data.data.lat)
-pressure_time_obc = np.ones([len(ecmwf_slp_data.data.time), obc_num], dtype='f')
-for itime in range(len(ecmwf_slp_data.data.time)):
-    interped_obc_tmp = griddata((LON.ravel(), LAT.ravel()), ecmwf_slp_data.data.slp[itime, :, :].ravel(),
-                        (obc_lon, obc_lat), method='nearest')
-    pressure_time_obc[itime, :] = interped_obc_tmp
-
-# 气压时间方向插值
-pressure_obc = np.ones([len(obc_data.data.time), obc_num])
-for iobc in range(obc_num):
-    func = interp1d(ecmwf_slp_data.data.time, pressure_time_obc[:, iobc])
-    pressure_obc_tmp = func(obc_data.data.time)
-    pressure_obc[:, iobc] = pressure_obc_tmp
-
-IB = -9.948 * (pressure_obc - 101325) * 0.01  # 单位 mm
-elevation = obc_data.data.elev + IB * 0.001
-
-# 写入到nc文件中
-prep = FvcomPrep(sms_path)
+# 气压插值到开边界点（最近点权重只算一次），逐块加上逆气压效应并写入到nc文件中
 output_ncfile = r'H:\fvcom\fvcom_input_file\julian_obc_adjusted_ecmwf.nc'
-ptime = num2date(obc_data.data.time)
-prep.write_obc_nc(output_ncfile, ptime, elevation)
+time_length = prep.write_obc_nc_chunks(
+    output_ncfile,
+    prep.iter_inverse_barometer_obc(obc_data.iter_obc_nc(720),
+                                    ecmwf_slp_data.data, method='nearest'))
+print('共写入{}个时刻'.format(time_length))
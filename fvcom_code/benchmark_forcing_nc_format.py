@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+# __NAME__   = benchmark_forcing_nc_format.py
+# __AUTHOR__ = 'QIU ZHOU'
+# __TIME__   = 2019/8/20 11:30
+
+"""
+    功能：比较表面强迫nc文件不同格式（NETCDF3、NETCDF4压缩、分块方式、量化）的写入时间、读取时间和文件大小
+"""
+from fvcom_tools_packages.fvcom_prep import FvcomPrep
+from fvcom_tools_packages.utily import PassiveStore
+from netCDF4 import Dataset
+import numpy as np
+import os
+import tempfile
+import matplotlib.dates as pltdate
+from datetime import datetime
+
+
+def synthetic_prep(nx, ny):
+    """
+    功能：不经过.2dm文件，生成一个规则三角网格的FvcomPrep对象
+    """
+    prep = FvcomPrep()
+    lon, lat = np.meshgrid(np.linspace(105, 135, nx), np.linspace(5, 40, ny))
+    node_id = np.arange(lon.size).reshape(ny, nx)
+    lower_left = node_id[:-1, :-1].ravel()
+    lower_right = node_id[:-1, 1:].ravel()
+    upper_left = node_id[1:, :-1].ravel()
+    upper_right = node_id[1:, 1:].ravel()
+    prep.tri = np.vstack([np.column_stack([lower_left, lower_right, upper_right]),
+                          np.column_stack([lower_left, upper_right, upper_left])])
+    prep.nv = prep.tri + 1
+    prep.lon = prep.x = lon.ravel()
+    prep.lat = prep.y = lat.ravel()
+    prep.lonc = prep.nodes2elems(prep.lon, prep.tri)
+    prep.latc = prep.nodes2elems(prep.lat, prep.tri)
+    prep.node = lon.size
+    prep.nele = len(prep.tri)
+    prep.nativeCoords = 'spherical'
+    return prep
+
+
+def synthetic_forcing(prep, time_length):
+    """
+    功能：生成平滑变化的风场和气压场（比随机数更接近真实数据的压缩率）
+    """
+    forcing_data = PassiveStore()
+    phase = np.linspace(0, 2 * np.pi, time_length)[:, None]
+    forcing_data.uwnd = (10 * np.sin(np.deg2rad(prep.lonc * 7) + phase)).astype('f')
+    forcing_data.vwnd = (10 * np.cos(np.deg2rad(prep.latc * 9) + phase)).astype('f')
+    forcing_data.slp = (101325 + 2000 * np.sin(np.deg2rad(prep.lon * 5) + phase)).astype('f')
+    forcing_data.time = pltdate.date2num(datetime(1993, 8, 1)) + np.arange(time_length) / 24
+    return forcing_data
+
+
+# %% 测试数据：约20万个网格，10天逐时数据
+prep = synthetic_prep(320, 320)
+forcing_data = synthetic_forcing(prep, 24 * 10)
+ptime = pltdate.num2date(forcing_data.time)
+out_dir = tempfile.mkdtemp()
+cases = [('NETCDF3_64BIT', {}),
+         ('NETCDF4 zlib 时间分块', {'nc_format': 'NETCDF4', 'chunking': 'time'}),
+         ('NETCDF4 zlib 空间分块', {'nc_format': 'NETCDF4', 'chunking': 'space'}),
+         ('NETCDF4 zlib 时间分块+量化', {'nc_format': 'NETCDF4', 'chunking': 'time',
+                                     'least_significant_digit': {'uwind_speed': 2,
+                                                                 'vwind_speed': 2,
+                                                                 'air_pressure': 0}})]
+
+# %% 计时
+print('{:<28s}{:>10s}{:>12s}{:>12s}{:>12s}'.format('格式', '大小(MB)', '写入(秒)',
+                                                   '读时刻(秒)', '读单点(秒)'))
+for i, (name, options) in enumerate(cases):
+    ncfile = os.path.join(out_dir, 'case{}.nc'.format(i))
+    t_start = datetime.now()
+    prep.write_surface_forcing(ncfile, ptime, forcing_data, **options)
+    write_seconds = (datetime.now() - t_start).total_seconds()
+    with Dataset(ncfile) as nc:
+        t_start = datetime.now()
+        for itime in range(0, len(ptime), 24):
+            nc.variables['uwind_speed'][itime, :]
+        time_read_seconds = (datetime.now() - t_start).total_seconds()
+        t_start = datetime.now()
+        for ielem in range(0, prep.nele, prep.nele // 10):
+            nc.variables['uwind_speed'][:, ielem]
+        point_read_seconds = (datetime.now() - t_start).total_seconds()
+    size = os.path.getsize(ncfile) / 2 ** 20
+    print('{:<28s}{:>10.1f}{:>12.2f}{:>12.2f}{:>12.2f}'.format(
+        name, size, write_seconds, time_read_seconds, point_read_seconds))
+    os.remove(ncfile)
+os.rmdir(out_dir)
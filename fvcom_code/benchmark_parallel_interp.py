@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+# __NAME__   = benchmark_parallel_interp.py
+# __AUTHOR__ = 'QIU ZHOU'
+# __TIME__   = 2019/8/14 15:05
+
+"""
+    功能：比较串行插值和沿时间维度并行插值（进程、线程）的速度，并检查结果是否一致
+"""
+from fvcom_tools_packages.interp_weights import bilinear_weights, apply_weights_parallel
+import numpy as np
+from datetime import datetime
+
+
+def timer(func, *args, **kwargs):
+    t_start = datetime.now()
+    result = func(*args, **kwargs)
+    return result, (datetime.now() - t_start).total_seconds()
+
+
+if __name__ == '__main__':
+    # %% 生成测试数据：ERA5的0.25度网格，一个月逐时数据，插值到50万个网格中心
+    lon = np.arange(100, 140.01, 0.25)
+    lat = np.arange(45, -0.01, -0.25)
+    time_length = 24 * 31
+    values = np.random.rand(time_length, len(lat), len(lon))
+    target_lon = np.random.uniform(105, 135, 500000)
+    target_lat = np.random.uniform(5, 40, 500000)
+    weights = bilinear_weights(lon, lat, target_lon, target_lat)
+
+    # %% 计时
+    serial_result, serial_seconds = timer(weights, values)
+    print('串行：{:.2f}秒'.format(serial_seconds))
+    for executor in ['thread', 'process']:
+        for workers in [2, 4, 8]:
+            result, seconds = timer(apply_weights_parallel, weights, values,
+                                    workers=workers, executor=executor)
+            assert np.allclose(result, serial_result)
+            print('{}，{}个worker：{:.2f}秒，加速比{:.1f}'.format(
+                executor, workers, seconds, serial_seconds / seconds))
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+# __NAME__   = benchmark_read_sms_grid.py
+# __AUTHOR__ = 'QIU ZHOU'
+# __TIME__   = 2019/8/2 10:15
+
+"""
+    功能：比较逐行读取sms网格（旧方法）和分块向量化读取（Grid.read_sms_grid）的速度，并检查结果是否一致
+"""
+from fvcom_tools_packages.fvcom_grid import Grid
+import numpy as np
+import os
+import tempfile
+from datetime import datetime
+
+
+def write_synthetic_sms(path, nx, ny):
+    """
+    功能：生成一个规则三角网格的.2dm文件，左边界作为开边界
+    :param path: 输出路径
+    :param nx: 经度方向点数
+    :param ny: 纬度方向点数
+    :return:
+    """
+    lon, lat = np.meshgrid(np.linspace(105, 135, nx), np.linspace(5, 40, ny))
+    depth = np.random.uniform(-5000, 10, lon.size)
+    node_id = np.arange(lon.size).reshape(ny, nx) + 1
+    lower_left = node_id[:-1, :-1].ravel()
+    lower_right = node_id[:-1, 1:].ravel()
+    upper_left = node_id[1:, :-1].ravel()
+    upper_right = node_id[1:, 1:].ravel()
+    tri = np.vstack([np.column_stack([lower_left, lower_right, upper_right]),
+                     np.column_stack([lower_left, upper_right, upper_left])])
+    with open(path, 'w') as f:
+        f.write('MESH2D\n')
+        for i, t in enumerate(tri, 1):
+            f.write('E3T {} {} {} {} 1\n'.format(i, *t))
+        for i, (x, y, z) in enumerate(zip(lon.ravel(), lat.ravel(), depth), 1):
+            f.write('ND {} {:.8e} {:.8e} {:.8e}\n'.format(i, x, y, z))
+        obc = node_id[:, 0]
+        for start in range(0, len(obc), 10):
+            ids = list(obc[start:start + 10])
+            if start + 10 >= len(obc):
+                ids[-1] = -ids[-1]
+            f.write('NS  ' + ' '.join(map(str, ids)) + '\n')
+
+
+def read_sms_grid_loop(grid_path):
+    """
+    功能：原来的逐行读取方法，只用于对比
+    """
+    sms_data = open(grid_path, 'r')
+    lines = sms_data.readlines()
+    sms_data.close()
+    triangles = []
+    nodes = []
+    types = []
+    node_strings = []
+    nstring = []
+    x = []
+    y = []
+    z = []
+    type_count = 2
+    for line in lines:
+        if line.startswith('E3T'):
+            ttt = line.split()
+            triangles.append([int(ttt[2]) - 1, int(ttt[3]) - 1, int(ttt[4]) - 1])
+        elif line.startswith('ND'):
+            xy = line.split()
+            x.append(float(xy[2]))
+            y.append(float(xy[3]))
+            z.append(float(xy[4]))
+            nodes.append(int(xy[1]))
+            types.append(0)
+        elif line.startswith('NS'):
+            all_types = line.split(' ')
+            for node_id in all_types[2:]:
+                types[np.abs(int(node_id) - 1)] = type_count
+                if int(node_id) > 0:
+                    nstring.append(int(node_id) - 1)
+                else:
+                    nstring.append(np.abs(int(node_id)) - 1)
+                    node_strings.append(nstring)
+                    nstring = []
+                if int(node_id) < 0:
+                    type_count += 1
+    return (np.asarray(triangles), np.asarray(nodes), np.asarray(x),
+            np.asarray(y), np.asarray(z), np.asarray(types),
+            np.asarray(node_strings).flatten())
+
+
+# %% 生成测试网格
+nx, ny = 700, 700  # 约49万个点，98万个网格
+tmp_dir = tempfile.mkdtemp()
+sms_path = os.path.join(tmp_dir, 'synthetic.2dm')
+write_synthetic_sms(sms_path, nx, ny)
+print('测试网格：{}，大小{:.1f}MB'.format(sms_path, os.path.getsize(sms_path) / 2 ** 20))
+
+# %% 计时
+t_start = datetime.now()
+loop_result = read_sms_grid_loop(sms_path)
+loop_seconds = (datetime.now() - t_start).total_seconds()
+
+grid = Grid.__new__(Grid)
+grid.grid_path = sms_path
+t_start = datetime.now()
+block_result = grid.read_sms_grid()
+block_seconds = (datetime.now() - t_start).total_seconds()
+
+names = ['tri', 'nodes', 'x', 'y', 'h', 'types', 'nodestrings']
+for name, old, new in zip(names, loop_result, block_result):
+    assert np.array_equal(old, new), '{}不一致'.format(name)
+print('逐行读取：{:.2f}秒'.format(loop_seconds))
+print('分块读取：{:.2f}秒'.format(block_seconds))
+print('加速比：{:.1f}'.format(loop_seconds / block_seconds))
+os.remove(sms_path)
+os.rmdir(tmp_dir)
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+# __NAME__   = benchmark_write_grid_fvcom.py
+# __AUTHOR__ = 'QIU ZHOU'
+# __TIME__   = 2019/8/5 16:40
+
+"""
+    功能：比较逐行写FVCOM网格输入文件（旧方法）和整块写入（Grid.write_grid_fvcom）的速度，并检查输出是否逐字节一致
+"""
+from fvcom_tools_packages.fvcom_grid import Grid
+import numpy as np
+import os
+import filecmp
+import shutil
+import tempfile
+from datetime import datetime
+
+
+def synthetic_grid(nx, ny):
+    """
+    功能：不经过.2dm文件，直接生成一个规则三角网格的Grid对象
+    """
+    grid = Grid.__new__(Grid)
+    lon, lat = np.meshgrid(np.linspace(105, 135, nx), np.linspace(5, 40, ny))
+    node_id = np.arange(lon.size).reshape(ny, nx)
+    lower_left = node_id[:-1, :-1].ravel()
+    lower_right = node_id[:-1, 1:].ravel()
+    upper_left = node_id[1:, :-1].ravel()
+    upper_right = node_id[1:, 1:].ravel()
+    grid.tri = np.vstack([np.column_stack([lower_left, lower_right, upper_right]),
+                          np.column_stack([lower_left, upper_right, upper_left])])
+    grid.grid_name = 'synthetic.2dm'
+    grid.lon = lon.ravel()
+    grid.lat = lat.ravel()
+    grid.h = np.random.uniform(1, 5000, lon.size)
+    grid.nodes = node_id.ravel() + 1
+    grid.open_boundary_nodes = node_id[:, 0]
+    grid.node = lon.size
+    grid.nele = len(grid.tri)
+    grid.obc = ny
+    return grid
+
+
+def write_grid_fvcom_loop(grid, output):
+    """
+    功能：原来的逐行写入方法，只用于对比
+    """
+    casename = grid.grid_name[:-4]
+    header1 = 'Node Number = ' + str(grid.node) + '\n'
+    header2 = 'Cell Number = ' + str(grid.nele) + '\n'
+    obc_header = 'OBC Node Number = ' + str(grid.obc) + '\n'
+    with open(os.path.join(output, casename + '_cor.dat'), 'w') as f:
+        f.write(header1)
+        for line in zip(grid.lon, grid.lat, grid.lat):
+            f.write('{:.6f} {:.6f} {:.6f}\n'.format(*line))
+    with open(os.path.join(output, casename + '_dep.dat'), 'w') as f:
+        f.write(header1)
+        for line in zip(grid.lon, grid.lat, grid.h):
+            f.write('{:.6f} {:.6f} {:.6f}\n'.format(*line))
+    with open(os.path.join(output, casename + '_grd.dat'), 'w') as f:
+        f.write(header1)
+        f.write(header2)
+        for i, triangle in enumerate(grid.tri, 1):
+            f.write('{node:d} {:d} {:d} {:d} {node:d}\n'.format(node=i, *triangle + 1))
+        for line in zip(grid.nodes, grid.lon, grid.lat, grid.h):
+            f.write('{:d} {:.6f} {:.6f}\n'.format(*line))
+    with open(os.path.join(output, casename + '_obc.dat'), 'w') as f:
+        f.write(obc_header)
+        for count, node in zip(np.arange(grid.obc) + 1, grid.open_boundary_nodes):
+            f.write('{} {:d} {:d}\n'.format(count, node + 1, 1))
+
+
+# %% 生成测试网格
+nx, ny = 1500, 1400  # 约210万个点，420万个网格
+grid = synthetic_grid(nx, ny)
+print('测试网格：{}个点，{}个网格'.format(grid.node, grid.nele))
+loop_dir = tempfile.mkdtemp()
+block_dir = tempfile.mkdtemp()
+parallel_dir = tempfile.mkdtemp()
+
+# %% 计时
+t_start = datetime.now()
+write_grid_fvcom_loop(grid, loop_dir)
+loop_seconds = (datetime.now() - t_start).total_seconds()
+
+t_start = datetime.now()
+grid.write_grid_fvcom(block_dir)
+block_seconds = (datetime.now() - t_start).total_seconds()
+
+t_start = datetime.now()
+grid.write_grid_fvcom(parallel_dir, parallel=True)
+parallel_seconds = (datetime.now() - t_start).total_seconds()
+
+for suffix in ['_cor.dat', '_dep.dat', '_grd.dat', '_obc.dat']:
+    name = 'synthetic' + suffix
+    for out_dir in [block_dir, parallel_dir]:
+        assert filecmp.cmp(os.path.join(loop_dir, name),
+                           os.path.join(out_dir, name), shallow=False), \
+            '{}不一致'.format(name)
+print('逐行写入：{:.2f}秒'.format(loop_seconds))
+print('整块写入：{:.2f}秒，加速比{:.1f}'.format(block_seconds, loop_seconds / block_seconds))
+print('4线程写入：{:.2f}秒，加速比{:.1f}'.format(parallel_seconds, loop_seconds / parallel_seconds))
+for out_dir in [loop_dir, block_dir, parallel_dir]:
+    shutil.rmtree(out_dir)
@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+# __NAME__   = calibrate_reconstructe_site_wind.py
+# __AUTHOR__ = 'QIU ZHOU'
+# __TIME__   = 2019/9/2 15:20
+
+from fvcom_tools_packages.read_data import ReadData
+from fvcom_tools_packages.reconstructe_calibrate import ReconstructeCalibration
+import numpy as np
+"""
+    功能：用多个站点的实测风速率定台风重构的参数（Rk，theta，c1，c2），模型只在站点和观测时刻上计算
+"""
+# %% 数据准备
+# 1993年Flo
+tp_track_path = r'H:\best_track\CH\CH1993BST.txt'
+tp_track_data = ReadData(tp_track_path, str_before='Flo', str_after='Gene', types='ch')
+# 站点数据和经纬度
+site_dir = r'E:\site_data\yjs_sql'
+stations = {'shengsi': (122.27, 30.44), 'shipu': (121.57, 29.12),
+            'dachen': (121.54, 28.27), 'yuhuan': (121.16, 28.05)}
+sites = [ReadData(site_dir + '\\' + name + '.xlsx', variables=['wind'],
+                  types='site_excel').data for name in stations]
+
+# %% 率定
+calibration = ReconstructeCalibration(tp_track_data.data, sites,
+                                      list(stations.values()), metric='speed')
+result = calibration.calibrate(Rk=np.arange(20, 65, 5), theta=np.arange(0, 45, 5),
+                               c1=np.arange(0.3, 1.25, 0.1),
+                               c2=np.arange(0.3, 1.25, 0.1))
+print('参与率定的观测个数：{}'.format(result.n_obs))
+print('最优参数：{}，均方根误差：{:.2f}m/s'.format(result.best, result.error))
+# 误差面，例如固定c1，c2的最优值后Rk和theta的误差
+i_c1 = np.abs(result.axes['c1'] - result.best['c1']).argmin()
+i_c2 = np.abs(result.axes['c2'] - result.best['c2']).argmin()
+print(result.surface[:, :, i_c1, i_c2])
@@ -70,7 +70,7 @@ interp_alti_time = select_alti_time_39[select_alti_sla_39.mask == False]
 interp_alti_lon = select_alti_lon[select_alti_sla_39.mask == False]
 interp_alti_lat = select_alti_lat[select_alti_sla_39.mask == False]
 grid_path = r'E:\fvcom\fvcom_input_file\sms.2dm'
-prep_obj = FvcomPrep(grid_path)
+prep_obj = FvcomPrep(grid_path, weight_dir=r'E:\fvcom\weights')  # 插值权重保存在硬盘，重复运行时直接读取
 interped_zeta = prep_obj.interp_temp_spatial(model_wind_data.lon,
                                              model_wind_data.lat,
                                              model_wind_data.data.time,
@@ -79,14 +79,8 @@ interped_zeta = prep_obj.interp_temp_spatial(model_wind_data.lon,
                                              interp_alti_time, time_single=True,
                                              regular=False)
 # 计算出模式中对于高度计点的三个月平均值，并计算最后的模式zeta
-position_indx = np.ones(len(interp_alti_lat))
-i = 0
-for ilon, ilat in zip(interp_alti_lon, interp_alti_lat):
-    position = (ilon, ilat)
-    indx_tmp = prep_obj.find_nearest_point('zeta', position)
-    position_indx[i] = indx_tmp.astype(int)
-    i += 1
-select_zeta = np.asarray([model_zeta[:, x.astype(int)] for x in position_indx])
+position_indx = prep_obj.find_nearest_points(interp_alti_lon, interp_alti_lat)
+select_zeta = model_zeta[:, position_indx].T
 mean_zeta = np.mean(select_zeta, axis=1)
 model_final_zeta = interped_zeta - np.mean(model_zeta)
 
@@ -18,21 +18,32 @@ from matplotlib.dates import num2date, date2num
 
 # %% 数据准备
 gauge_path = r'E:\gauge_data\h632a93.dat'  # 376表示厦门，632表示坎门
-model_wind_path = r'E:\fvcom\fvcom_output_file\windNCEP_0001.nc'
-model_tide_path = r'E:\fvcom\fvcom_output_file\AtideIB_0001.nc'
+# 模式输出可以是通配符或者list，多个编号的输出文件按时间拼接
+model_wind_path = r'E:\fvcom\fvcom_output_file\windNCEP_*.nc'
+model_tide_path = r'E:\fvcom\fvcom_output_file\AtideIB_*.nc'
 position_site = (121.169, 28.053)  # 厦门地理坐标(118.04, 24.27)，坎门的为(121.169, 28.053)
 
 # %% 模式数据处理
-model_tide_data = ReadData(model_tide_path, types='fvcom',
-                           variables=['zeta'])
-model_wind_data = ReadData(model_wind_path, types='fvcom',
-                           variables=['zeta'])
-model_zeta = model_wind_data.data.zeta - model_tide_data.data.zeta
-model_start_time = model_tide_data.data.time[0]
-model_end_time = model_tide_data.data.time[-1]
-gauge_indx = model_tide_data.find_nearest_point('zeta', position_site)
-# 减去模式的平均值(减去的平均值是模式结果的整体平均，非个点)
-specific_mzeta = model_zeta[:, gauge_indx] - model_zeta.mean()
+# lazy=True，只读取验潮站所在的一列；整体平均按时间分块读取
+with ReadData(model_tide_path, types='fvcom', variables=['zeta'],
+              lazy=True) as model_tide_data, \
+        ReadData(model_wind_path, types='fvcom', variables=['zeta'],
+                 lazy=True) as model_wind_data:
+    model_time = model_tide_data.data.time
+    model_start_time = model_time[0]
+    model_end_time = model_time[-1]
+    tide_table = model_tide_data.extract_stations([position_site], variables=['zeta'])
+    wind_table = model_wind_data.extract_stations([position_site], variables=['zeta'])
+    # 减去模式的平均值(减去的平均值是模式结果的整体平均，非个点)
+    # 被掩码的值（例如干的网格）不参与平均，与整体读取后的model_zeta.mean()相同
+    zeta_sum, zeta_count = 0.0, 0
+    for start in range(0, len(model_time), 24):
+        model_zeta = np.ma.asarray(model_wind_data.data.zeta[start:start + 24] -
+                                   model_tide_data.data.zeta[start:start + 24])
+        zeta_sum += model_zeta.filled(0).sum()
+        zeta_count += model_zeta.count()
+    model_zeta_mean = zeta_sum / zeta_count
+specific_mzeta = wind_table['zeta'].values - tide_table['zeta'].values - model_zeta_mean
 
 # %% 验潮站数据处理
 gauge_data = ReadData(gauge_path, types='gauge')
@@ -57,10 +68,8 @@ select_end_indx = np.where(gauge_data.data.time == select_time_stamp[-1])[0][0]
 select_gauge_zeta = gauge_zeta[
                     select_start_indx:select_end_indx + 1] - gauge_mean_zeta
 # 选择时间范围的模式数据（减去平均）
-select_start_mindx = \
-    np.where(model_tide_data.data.time == select_time_stamp[0])[0][0]
-select_end_mindx = \
-    np.where(model_tide_data.data.time == select_time_stamp[-1])[0][0]
+select_start_mindx = np.where(model_time == select_time_stamp[0])[0][0]
+select_end_mindx = np.where(model_time == select_time_stamp[-1])[0][0]
 select_model_zeta = specific_mzeta[select_start_mindx:select_end_mindx + 1]
 
 # %% 画图
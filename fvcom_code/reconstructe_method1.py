@@ -5,9 +5,8 @@
 # __TIME__   = 2019/6/20 9:22
 
 from fvcom_tools_packages.read_data import ReadData
-from fvcom_tools_packages.reconstructe_wind import Reconstructe
+from fvcom_tools_packages.reconstructe_wind import TrackReconstructe
 from fvcom_tools_packages.fvcom_prep import FvcomPrep
-from fvcom_tools_packages.fvcom_grid import Grid
 from fvcom_tools_packages.fvcom_plot import PlotFigure
 from matplotlib.dates import num2date
 import numpy as np
@@ -37,42 +36,26 @@ fvcom_data.data.vwnd[:] = 0
 
 
 # 重构风场
-# 所求风场点的经纬度
-lon = fvcom_data.data.lonc
-lat = fvcom_data.data.latc
-lon1 = fvcom_data.data.lon
-lat1 = fvcom_data.data.lat
-# 某个台风中心经纬度、气压和最大风速，i代表第i+1个
-for i in range(len(tp_track_data.data.tp_lon)-1):
+# 整条路径一起重构：气压在网格点上，风场在网格中心上
+recon_data = TrackReconstructe(tp_track_data.data,
+                               fvcom_data.lon, fvcom_data.lat,
+                               fvcom_data.lonc, fvcom_data.latc,
+                               P1=1013.25,  # 外围气压
+                               theta=20,    # 台风入流角
+                               Rk=40).reconstructe(c1=0.5, c2=0.9)
 
-    lonc = tp_track_data.data.tp_lon[i]
-    latc = tp_track_data.data.tp_lat[i]
-    Pc = tp_track_data.data.tp_press[i]
-    P1 = 1013.25   # 外围气压
-    Vmax = tp_track_data.data.tp_vmax[i]
-    lonc_af = tp_track_data.data.tp_lon[i+1]
-    latc_af = tp_track_data.data.tp_lat[i+1]
-    dt = 6
-    theta = 20  # 台风入流角
+# 替换对应时间的气压值和风场值
+found = np.isin(recon_data.time, fvcom_data.data.time)
+time_index = np.searchsorted(fvcom_data.data.time, recon_data.time[found])
+fvcom_data.data.slp[time_index, :] = recon_data.slp[found]
+fvcom_data.data.uwnd[time_index, :] = recon_data.uwnd[found]
+fvcom_data.data.vwnd[time_index, :] = recon_data.vwnd[found]
 
-    reconstruct_wind1 = Reconstructe(lon1, lat1, lonc, latc, Pc, P1,
-                                Vmax, lonc_af, latc_af, dt, theta, Rk=40)
-
-    reconstruct_wind = Reconstructe(lon, lat, lonc, latc, Pc, P1,
-                                Vmax, lonc_af, latc_af, dt, theta, Rk=40)
-    uwind, vwind, wind = reconstruct_wind.synthesis_windfield(c1=0.5, c2=0.9)
-
-    # 替换对应时间的气压值和风场值
-    tp_time = tp_track_data.data.tp_time[i]
-    time_index = np.where(tp_time == fvcom_data.data.time)[0][0]
-    fvcom_data.data.slp[time_index, :] = reconstruct_wind1.Pr * 100
-    fvcom_data.data.uwnd[time_index, :] = uwind
-    fvcom_data.data.vwnd[time_index, :] = vwind
-
-    # # 画风场图
-    # plot = PlotFigure(grid_path=grid_path, figsize=(12, 8), title='method1_reconstruction', extents=[105, 135, 5, 40])
-    # img = plot.plot_field_based_grid(wind)
-    # plot.show()
+# # 画风场图
+# plot = PlotFigure(grid_path=grid_path, figsize=(12, 8), title='method1_reconstruction', extents=[105, 135, 5, 40])
+# wind = np.sqrt(recon_data.uwnd[0] ** 2 + recon_data.vwnd[0] ** 2)
+# img = plot.plot_field_based_grid(wind)
+# plot.show()
 
 # 网格数据路径
 grid_path = r'H:\fvcom\fvcom_input_file\sms.2dm'
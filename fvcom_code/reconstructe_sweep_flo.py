@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+# __NAME__   = reconstructe_sweep_flo.py
+# __AUTHOR__ = 'QIU ZHOU'
+# __TIME__   = 2019/8/28 15:30
+
+from fvcom_tools_packages.read_data import ReadData
+from fvcom_tools_packages.fvcom_prep import FvcomPrep
+from fvcom_tools_packages.reconstructe_wind import interp_track
+from fvcom_tools_packages.reconstructe_sweep import ReconstructeSweep, parameter_grid
+from matplotlib.dates import num2date, drange
+from datetime import timedelta
+
+"""
+    功能：台风重构参数的集合试验（代替修改reconstructe_method1.py后反复运行），
+         每个成员的强迫单独输出一个nc文件，summary.csv中记录每个成员的参数和运行时间
+"""
+if __name__ == '__main__':
+    # 1993年Flo，插值到逐时
+    tp_track_path = r'H:\best_track\CH\CH1993BST.txt'
+    tp_track_data = ReadData(tp_track_path, str_before='Flo', str_after='Gene', types='ch')
+    start, end = num2date(tp_track_data.data.tp_time[[0, -1]])
+    hourly_track = interp_track(tp_track_data.data,
+                                drange(start, end + timedelta(hours=1), timedelta(hours=1)))
+
+    # 网格数据路径
+    grid_path = r'H:\fvcom\fvcom_input_file\sms.2dm'
+    prep = FvcomPrep(grid_path)
+
+    members = parameter_grid(Rk=[30, 40, 50], theta=[15, 20, 25],
+                             c1=[0.5, 0.8], c2=[0.8, 0.9], Rmax_mold=[1, 2])
+    sweep = ReconstructeSweep(hourly_track, prep, r'H:\fvcom\fvcom_input_file\flo_sweep',
+                              casename='flo')
+    summary = sweep.run(members, workers=8)
+    print(summary)
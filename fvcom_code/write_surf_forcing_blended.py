@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+# __NAME__   = write_surf_forcing_blended.py
+# __AUTHOR__ = 'QIU ZHOU'
+# __TIME__   = 2019/8/26 9:50
+
+from fvcom_tools_packages.read_data import ReadData
+from fvcom_tools_packages.fvcom_prep import FvcomPrep
+from fvcom_tools_packages.utily import merge_stores
+import os
+"""
+    方法：台风中心附近使用参数化模型（Fujita气压场 + 梯度风 + ueno移动风场），远处使用ecmwf的风场和气压场，
+         中间按到台风中心的距离余弦过渡。按时间窗口逐块插值、合成并追加写入nc文件，不需要一次生成整个时段
+"""
+# 台风最佳路径数据，1993年Flo
+tp_track_path = r'H:\best_track\CH\CH1993BST.txt'
+tp_track_data = ReadData(tp_track_path, str_before='Flo', str_after='Gene', types='ch')
+
+# ecmwf数据，不设置types，逐块读取
+ecmwf_wind_dir = r'E:\ecmwf\wind\1993'
+ecmwf_wind_files = os.listdir(ecmwf_wind_dir)
+select_ecmwf_wind_path = [os.path.join(ecmwf_wind_dir, x) for x in ecmwf_wind_files[7:10]]
+ecmwf_slp_dir = r'E:\ecmwf\press\1993'
+ecmwf_slp_files = os.listdir(ecmwf_slp_dir)
+select_ecmwf_slp_path = [os.path.join(ecmwf_slp_dir, x) for x in ecmwf_slp_files[7:10]]
+ecmwf_wind_data = ReadData(select_ecmwf_wind_path, variables=['wind'],
+                           extents=[105, 135, 5, 45])
+ecmwf_slp_data = ReadData(select_ecmwf_slp_path, variables=['slp'],
+                          extents=[105, 135, 5, 45])
+chunk_size = 24  # 每次处理一天的逐时数据
+ecmwf_chunks = (merge_stores(wind, slp) for wind, slp in
+                zip(ecmwf_wind_data.iter_ecmwf_data(chunk_size),
+                    ecmwf_slp_data.iter_ecmwf_data(chunk_size)))
+
+# 网格数据路径
+grid_path = r'H:\fvcom\fvcom_input_file\sms.2dm'
+prep = FvcomPrep(grid_path, weight_dir=r'H:\fvcom\weights')
+# 逐块合成并写入nc
+time_length = prep.write_surface_forcing_chunks(
+    r'H:\fvcom\fvcom_input_file\ecmwf_08_10_blend.nc',
+    prep.iter_blended_forcing(ecmwf_chunks, tp_track_data.data,
+                              radius_inner=300e3, radius_outer=600e3,
+                              method='bilinear', c1=0.5, c2=0.9,
+                              P1=1013.25, theta=20, Rk=40))
+print('共写入{}个时刻'.format(time_length))
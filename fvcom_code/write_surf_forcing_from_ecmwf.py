@@ -48,8 +48,8 @@ ecmwf_plot.show()
 # 网格数据路径
 grid_path = r'H:\fvcom\fvcom_input_file\sms.2dm'
 # 表面强迫的插值
-prep = FvcomPrep(grid_path)
-interped_data = prep.interp_surface_forcing(ecmwf_data)
+prep = FvcomPrep(grid_path, weight_dir=r'H:\fvcom\weights')  # 插值权重保存在硬盘，重复运行时直接读取
+interped_data = prep.interp_surface_forcing(ecmwf_data, method='bilinear')
 wind_speed = np.sqrt(interped_data.uwnd ** 2 + interped_data.vwnd ** 2)
 # 插值后ncep画图
 fig_obj = PlotFigure(grid_path=grid_path, figsize=(12, 8),
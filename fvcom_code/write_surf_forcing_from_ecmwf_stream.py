@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+# __NAME__   = write_surf_forcing_from_ecmwf_stream.py
+# __AUTHOR__ = 'QIU ZHOU'
+# __TIME__   = 2019/8/12 10:20
+
+from fvcom_tools_packages.read_data import ReadData
+from fvcom_tools_packages.fvcom_prep import FvcomPrep
+from fvcom_tools_packages.utily import merge_stores
+import os
+"""
+    功能：表面强迫的nc输入，包括风场和气压场，数据来源ECMWF。
+         按时间窗口逐块读取、插值并追加写入，适合长时间的逐时数据（内存只与chunk_size有关）
+"""
+# 列出需要读取ecmwf数据的路径
+ecmwf_wind_dir = r'E:\ecmwf\wind\1993'
+ecmwf_wind_files = os.listdir(ecmwf_wind_dir)
+select_ecmwf_wind_path = [os.path.join(ecmwf_wind_dir, x) for x in ecmwf_wind_files[7:10]]
+
+ecmwf_slp_dir = r'E:\ecmwf\press\1993'
+ecmwf_slp_files = os.listdir(ecmwf_slp_dir)
+select_ecmwf_slp_path = [os.path.join(ecmwf_slp_dir, x) for x in ecmwf_slp_files[7:10]]
+
+# 不设置types，构造时不读取数据
+ecmwf_wind_data = ReadData(select_ecmwf_wind_path, variables=['wind'],
+                           extents=[105, 135, 5, 45])
+ecmwf_slp_data = ReadData(select_ecmwf_slp_path, variables=['slp'],
+                          extents=[105, 135, 5, 45])
+chunk_size = 24  # 每次处理一天的逐时数据
+ecmwf_chunks = (merge_stores(wind, slp) for wind, slp in
+                zip(ecmwf_wind_data.iter_ecmwf_data(chunk_size),
+                    ecmwf_slp_data.iter_ecmwf_data(chunk_size)))
+
+# 网格数据路径
+grid_path = r'H:\fvcom\fvcom_input_file\sms.2dm'
+prep = FvcomPrep(grid_path, weight_dir=r'H:\fvcom\weights')  # 插值权重保存在硬盘，重复运行时直接读取
+# 逐块插值并写入nc
+time_length = prep.write_surface_forcing_chunks(
+    r'H:\fvcom\fvcom_input_file\ecmwf_08_10_wnd.nc',
+    prep.iter_surface_forcing(ecmwf_chunks, method='bilinear'))
+print('共写入{}个时刻'.format(time_length))
@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+# __NAME__   = write_surf_forcing_from_track.py
+# __AUTHOR__ = 'QIU ZHOU'
+# __TIME__   = 2019/8/22 15:40
+
+from fvcom_tools_packages.read_data import ReadData
+from fvcom_tools_packages.reconstructe_wind import TrackReconstructe, interp_track
+from fvcom_tools_packages.fvcom_prep import FvcomPrep
+from matplotlib.dates import num2date, drange
+from datetime import timedelta
+
+"""
+    方法：把6小时一次的台风最佳路径插值成逐时的路径，气压场采用Fujita公式，然后计算梯度风，叠加ueno的移动风场
+          按时间窗口逐块重构并追加写入表面强迫的nc文件，不需要一次生成整个时段
+"""
+
+# 1993年Flo
+tp_track_path = r'H:\best_track\CH\CH1993BST.txt'
+tp_track_data = ReadData(tp_track_path, str_before='Flo', str_after='Gene', types='ch')
+
+# 路径插值到逐时
+start, end = num2date(tp_track_data.data.tp_time[[0, -1]])
+hourly = drange(start, end + timedelta(hours=1), timedelta(hours=1))
+hourly_track = interp_track(tp_track_data.data, hourly, method='spline')
+
+# 网格数据路径
+grid_path = r'H:\fvcom\fvcom_input_file\sms.2dm'
+prep = FvcomPrep(grid_path)
+engine = TrackReconstructe(hourly_track, prep.lon, prep.lat, prep.lonc, prep.latc,
+                           P1=1013.25,  # 外围气压
+                           theta=20,    # 台风入流角
+                           Rk=40)
+# 逐块重构并写入nc
+time_length = prep.write_surface_forcing_chunks(
+    r'H:\fvcom\fvcom_input_file\flo_track_hourly.nc',
+    engine.iter_forcing(c1=0.5, c2=0.9, chunk_size=24))
+print('共写入{}个时刻'.format(time_length))
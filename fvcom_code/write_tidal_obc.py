@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+# __NAME__   = write_tidal_obc.py
+# __AUTHOR__ = 'QIU ZHOU'
+# __TIME__   = 2019/8/20 10:15
+
+"""
+    功能：由开边界点的调和常数合成潮位，逐块写入obc的nc文件（代替预先算好的julian_obc_all.nc）
+         调和常数文件每行一个开边界点的一个分潮：node，constituent，amplitude（米），phase（度，格林尼治迟角）
+"""
+from fvcom_tools_packages.fvcom_prep import FvcomPrep
+import pandas as pd
+from datetime import datetime, timedelta
+
+# 网格文件
+sms_path = r'H:\fvcom\fvcom_input_file\sms.2dm'
+prep = FvcomPrep(sms_path)
+
+# 调和常数，整理为（分潮，开边界点）的矩阵，列的顺序与open_boundary_nodes一致
+constants_path = r'H:\fvcom\fvcom_input_file\obc_tidal_constants.csv'
+constants = pd.read_csv(constants_path)
+constituents = ['M2', 'S2', 'N2', 'K2', 'K1', 'O1', 'P1', 'Q1', 'M4', 'MS4', 'MN4']
+obc_nodes = prep.open_boundary_nodes + 1
+amplitude = constants.pivot(index='constituent', columns='node',
+                            values='amplitude').loc[constituents, obc_nodes].values
+phase = constants.pivot(index='constituent', columns='node',
+                        values='phase').loc[constituents, obc_nodes].values
+
+# 逐块合成并写入nc
+output_ncfile = r'H:\fvcom\fvcom_input_file\julian_obc_tide_1993.nc'
+time_length = prep.write_obc_nc_chunks(
+    output_ncfile,
+    prep.iter_tidal_obc(constituents, amplitude, phase,
+                        start=datetime(1993, 1, 1),
+                        end=datetime(1993, 12, 31, 23, 50),
+                        interval=timedelta(minutes=10)))
+print('共写入{}个时刻'.format(time_length))
@@ -4,38 +4,133 @@
 # __AUTHOR__ = 'QIU ZHOU'
 # __TIME__   = 2019/6/5 22:36
 
+import os
+import hashlib
+import logging
+import zipfile
 import numpy as np
+from itertools import islice, chain
+from concurrent.futures import ThreadPoolExecutor
+from scipy.spatial import cKDTree
+from scipy.sparse import csr_matrix
+from .utily import lonlat_to_xyz
+
+
+logger = logging.getLogger(__name__)
+
+# 网格缓存文件的版本号，缓存内容有变化时加1
+GRID_CACHE_VERSION = 1
+
 
 class Grid(object):
-    def __init__(self, grid_path, native_coordinate='spherical'):
+    def __init__(self, grid_path, native_coordinate='spherical', cache=True):
+        """
+        参数：
+        :param grid_path: sms网格（.2dm）路径
+        :param native_coordinate: 坐标类型，默认为spherical
+        :param cache: True表示使用网格旁边的.npz缓存，.2dm文件改变后自动重建
+        """
         self.grid_path = grid_path
-        self.grid_name = grid_path.split('\\')[-1]
-        triangle, nodes, x, y, z, types, nodestrings = self.read_sms_grid()
-        self.node = len(nodes)
-        self.nele = len(triangle)
-        self.obc = len(nodestrings)
-        self.x = x
-        self.y = y
-        self.lon = x
-        self.lat = y
-        self.h = z
-        self.tri = triangle
-        self.nv = triangle + 1
-        self.nodes = nodes
-        self.types = types
-        self.open_boundary_nodes = nodestrings
-        self.lonc = self.nodes2elems(self.lon, self.tri)
-        self.latc = self.nodes2elems(self.lat, self.tri)
-        self.xc = self.nodes2elems(self.x, self.tri)
-        self.yc = self.nodes2elems(self.y, self.tri)
-        self.h_center = self.nodes2elems(self.h, self.tri)
+        self.grid_name = os.path.basename(grid_path).split('\\')[-1]
+        self.grid_cache_path = grid_path + '.npz'
+        grid_data = self.load_grid_cache() if cache else None
+        if grid_data is None:
+            triangle, nodes, x, y, z, types, nodestrings = self.read_sms_grid()
+            grid_data = {'tri': triangle, 'nodes': nodes, 'x': x, 'y': y,
+                         'h': z, 'types': types,
+                         'open_boundary_nodes': nodestrings,
+                         'lonc': self.nodes2elems(x, triangle),
+                         'latc': self.nodes2elems(y, triangle),
+                         'h_center': self.nodes2elems(z, triangle)}
+            if cache:
+                self.save_grid_cache(grid_data)
+        self.node = len(grid_data['nodes'])
+        self.nele = len(grid_data['tri'])
+        self.obc = len(grid_data['open_boundary_nodes'])
+        self.x = grid_data['x']
+        self.y = grid_data['y']
+        self.lon = self.x
+        self.lat = self.y
+        self.h = grid_data['h']
+        self.tri = grid_data['tri']
+        self.nv = self.tri + 1
+        self.nodes = grid_data['nodes']
+        self.types = grid_data['types']
+        self.open_boundary_nodes = grid_data['open_boundary_nodes']
+        self.lonc = grid_data['lonc']
+        self.latc = grid_data['latc']
+        self.xc = self.lonc
+        self.yc = self.latc
+        self.h_center = grid_data['h_center']
         self.nativeCoords = native_coordinate
 
-    def read_sms_grid(self, nodestrings=True):
+    def _grid_file_key(self, content_hash=False):
+        """
+        功能：计算.2dm文件的缓存键：文件大小、修改时间，以及（可选）内容的sha1
+        """
+        stat = os.stat(self.grid_path)
+        key = {'size': stat.st_size, 'mtime': stat.st_mtime_ns}
+        if content_hash:
+            sha1 = hashlib.sha1()
+            with open(self.grid_path, 'rb') as f:
+                for block in iter(lambda: f.read(2 ** 20), b''):
+                    sha1.update(block)
+            key['sha1'] = sha1.hexdigest()
+        return key
+
+    def load_grid_cache(self):
+        """
+        功能：读取网格缓存，缓存不存在或者.2dm文件已经改变时返回None
+        大小和修改时间都没变时直接使用缓存；修改时间变了但内容的sha1没变时（例如复制文件）也使用缓存并更新修改时间
+        :return: grid_data: 网格数组组成的dict
+        """
+        if not os.path.exists(self.grid_cache_path):
+            return None
+        try:
+            with np.load(self.grid_cache_path) as cache_file:
+                grid_data = {name: cache_file[name] for name in cache_file.files}
+            if int(grid_data.pop('version')) != GRID_CACHE_VERSION:
+                return None
+            size = int(grid_data.pop('size'))
+            mtime = int(grid_data.pop('mtime'))
+            sha1 = str(grid_data.pop('sha1'))
+        except (OSError, ValueError, KeyError, zipfile.BadZipFile):
+            logger.warning('网格缓存文件损坏，重新读取网格：%s', self.grid_cache_path)
+            return None
+        key = self._grid_file_key()
+        if key['size'] != size:
+            return None
+        if key['mtime'] != mtime:
+            if self._grid_file_key(content_hash=True)['sha1'] != sha1:
+                return None
+            self.save_grid_cache(grid_data, sha1=sha1)
+        return grid_data
+
+    def save_grid_cache(self, grid_data, sha1=None):
+        """
+        功能：将网格数组写入缓存文件（先写临时文件再替换，避免写到一半的缓存）
+        :param grid_data: 网格数组组成的dict
+        :param sha1: .2dm文件内容的sha1，None表示重新计算
+        """
+        key = self._grid_file_key(content_hash=sha1 is None)
+        if sha1 is not None:
+            key['sha1'] = sha1
+        tmp_path = self.grid_cache_path + '.tmp'
+        try:
+            with open(tmp_path, 'wb') as f:
+                np.savez(f, version=GRID_CACHE_VERSION, size=key['size'],
+                         mtime=key['mtime'], sha1=key['sha1'], **grid_data)
+            os.replace(tmp_path, self.grid_cache_path)
+        except OSError:
+            logger.warning('无法写入网格缓存文件：%s', self.grid_cache_path)
+
+    def read_sms_grid(self, nodestrings=True, chunk_lines=500000):
         """
         功能：读取sms网格数据
+        逐块读取文件，按标签（E3T/ND/NS）分类后用numpy整块转换，避免逐行转换和一次性readlines
         参数：
         :param nodestrings: 设置Ture表示读取nodestring
+        :param chunk_lines: 每次读取的行数，决定峰值内存
         返回：
         :return triangle：每个网格三角形的三个node点，shape（nele，3）
         :return nodes：每个点的编号
@@ -43,53 +138,57 @@ class Grid(object):
         :return types：每一个点的类型，用数字表示，一般情况不用
         :return nodestring: 边界点的node
         """
-        sms_data = open(self.grid_path, 'r')
-        lines = sms_data.readlines()
-        sms_data.close()
-        triangles = []
-        nodes = []
-        types = []
-        node_strings = []
-        nstring = []
-        x = []
-        y = []
-        z = []
-        type_count = 2
-        for line in lines:
-            line.strip()    # strip()表示去掉字符串头尾空格
-            if line.startswith('E3T'):
-                ttt = line.split()
-                t1 = int(ttt[2]) - 1
-                t2 = int(ttt[3]) - 1
-                t3 = int(ttt[4]) - 1
-                triangles.append([t1, t2, t3])
-            elif line.startswith('ND'):
-                xy = line.split()
-                x.append(float(xy[2]))
-                y.append(float(xy[3]))
-                z.append(float(xy[4]))
-                nodes.append(int(xy[1]))
-                types.append(0)
-            elif line.startswith('NS'):
-                all_types = line.split(' ')
-                for node_id in all_types[2:]:
-                    types[np.abs(int(node_id) - 1)] = type_count
-                    if int(node_id) > 0:
-                        nstring.append(int(node_id) - 1)
-                    else:
-                        nstring.append(np.abs(int(node_id)) - 1)
-                        node_strings.append(nstring)
-                        nstring = []
-                    if int(node_id) < 0:
-                        type_count += 1
-        # 转化为numpy数组, np.asarray 和 np.array 区别是 前者是cut，或者是copy
-        triangle = np.asarray(triangles)
-        nodes = np.asarray(nodes)
-        types = np.asarray(types)
-        node_strings = np.asarray(node_strings).flatten()
-        X = np.asarray(x)
-        Y = np.asarray(y)
-        Z = np.asarray(z)
+        tri_blocks = []
+        nd_blocks = []
+        ns_blocks = []
+        with open(self.grid_path, 'r') as sms_data:
+            while True:
+                lines = list(islice(sms_data, chunk_lines))
+                if not lines:
+                    break
+                e3t_lines = []
+                nd_lines = []
+                for line in lines:
+                    tag = line[:3]
+                    if tag == 'E3T':
+                        e3t_lines.append(line)
+                    elif tag[:2] == 'ND':
+                        nd_lines.append(line)
+                    elif tag[:2] == 'NS':
+                        ns_blocks.append(np.array(line.split()[1:], dtype=int))
+                if e3t_lines:
+                    tri_blocks.append(np.loadtxt(e3t_lines, usecols=(2, 3, 4),
+                                                 dtype=int, ndmin=2) - 1)
+                if nd_lines:
+                    nd_blocks.append(np.loadtxt(nd_lines, usecols=(1, 2, 3, 4),
+                                                ndmin=2))
+        # 转化为numpy数组
+        if tri_blocks:
+            triangle = np.concatenate(tri_blocks)
+        else:
+            triangle = np.empty((0, 3), dtype=int)
+        if nd_blocks:
+            nd_data = np.concatenate(nd_blocks)
+        else:
+            nd_data = np.empty((0, 4))
+        nodes = nd_data[:, 0].astype(int)
+        X = nd_data[:, 1]
+        Y = nd_data[:, 2]
+        Z = nd_data[:, 3]
+        types = np.zeros(len(nodes), dtype=int)
+        if ns_blocks:
+            node_ids = np.concatenate(ns_blocks)
+        else:
+            node_ids = np.empty(0, dtype=int)
+        # 负号表示一条nodestring的结束，之后的点类型加1（下标与逐行读取时的abs(id - 1)保持一致）
+        string_end = node_ids < 0
+        types[np.abs(node_ids - 1)] = 2 + np.cumsum(string_end) - string_end
+        # 只保留已经结束的nodestring
+        closed = np.flatnonzero(string_end)
+        if len(closed):
+            node_strings = np.abs(node_ids[:closed[-1] + 1]) - 1
+        else:
+            node_strings = np.empty(0, dtype=int)
         if nodestrings:
             return triangle, nodes, X, Y, Z, types, node_strings
         else:
@@ -111,21 +210,23 @@ class Grid(object):
 
         return elems
 
-    def write_grid_fvcom(self, output):
+    def write_grid_fvcom(self, output, parallel=False):
         """
         功能：讲mesh的数据写入到FVCOM输入文件中：_cor.dat, _grd.dat, _dep.dat, _obc.data
+        整块格式化数组后再写入，输出与逐行format完全一致
         参数：
         :param output: 输出路径
+        :param parallel: True表示用4个线程同时写4个文件
         返回：
         :return: 4个文件
         """
         # 获取名字（去除.2dm）
         casename = self.grid_name[:-4]
         # FVCOM 4个输入文件的路径
-        cor_file = output + '\\' + casename + '_cor.dat'
-        dep_file = output + '\\' + casename + '_dep.dat'
-        grd_file = output + '\\' + casename + '_grd.dat'
-        obc_file = output + '\\' + casename + '_obc.dat'
+        cor_file = os.path.join(output, casename + '_cor.dat')
+        dep_file = os.path.join(output, casename + '_dep.dat')
+        grd_file = os.path.join(output, casename + '_grd.dat')
+        obc_file = os.path.join(output, casename + '_obc.dat')
 
         # 文件的header
         header1 = 'Node Number = ' + str(self.node) + '\n'
@@ -133,48 +234,349 @@ class Grid(object):
         obc_header = 'OBC Node Number = ' + str(self.obc) + '\n'
 
         # 处理水深数据
-        negative_total = sum(self.h < 0)
-        positive_total = sum(self.h > 0)
+        negative_total = np.sum(self.h < 0)
+        positive_total = np.sum(self.h > 0)
         if negative_total > positive_total:
             self.h = -self.h
             # print('Flipping depths to be positive down since we have been supplied with mostly negative depths.')
 
-        # 写cor文件
-        with open(cor_file, 'w') as f:
-            f.write(header1)
-            for line in zip(self.lon, self.lat, self.lat):
-                f.write('{:.6f} {:.6f} {:.6f}\n'.format(*line))
-        # 写depth文件
-        with open(dep_file, 'w') as f:
-            f.write(header1)
-            for line in zip(self.lon, self.lat, self.h):
-                f.write('{:.6f} {:.6f} {:.6f}\n'.format(*line))
-        # 写grd文件
-        with open(grd_file, 'w') as f:
-            f.write(header1)
-            f.write(header2)
-            for i, triangle in enumerate(self.tri, 1):
-                f.write('{node:d} {:d} {:d} {:d} {node:d}\n'.format(node=i, *triangle + 1))
-            for line in zip(self.nodes, self.lon, self.lat, self.h):
-                f.write('{:d} {:.6f} {:.6f}\n'.format(*line))
-        # 写obc文件
-        with open(obc_file, 'w') as f:
-            f.write(obc_header)
-            for count, node in zip(np.arange(self.obc)+1, self.open_boundary_nodes):
-                f.write('{} {:d} {:d}\n'.format(count, node + 1, 1))
+        element_id = np.arange(1, self.nele + 1)
+        nv = self.tri + 1
+        # 每个文件由header和若干个（格式，列）组成
+        files = {
+            cor_file: ([header1],
+                       [('%.6f %.6f %.6f\n', [self.lon, self.lat, self.lat])]),
+            dep_file: ([header1],
+                       [('%.6f %.6f %.6f\n', [self.lon, self.lat, self.h])]),
+            grd_file: ([header1, header2],
+                       [('%d %d %d %d %d\n', [element_id, nv[:, 0], nv[:, 1],
+                                                nv[:, 2], element_id]),
+                        ('%d %.6f %.6f\n', [self.nodes, self.lon, self.lat])]),
+            obc_file: ([obc_header],
+                       [('%d %d %d\n', [np.arange(1, self.obc + 1),
+                                         self.open_boundary_nodes + 1,
+                                         np.ones(self.obc, dtype=int)])]),
+        }
+        if parallel:
+            with ThreadPoolExecutor(max_workers=len(files)) as executor:
+                jobs = [executor.submit(_write_dat_file, name, *files[name])
+                        for name in files]
+                for job in jobs:
+                    job.result()
+        else:
+            for name in files:
+                _write_dat_file(name, *files[name])
 
-    def find_nearest_point(self, var, point):
-        lon_station = point[0]
-        lat_station = point[1]
+    def _topology(self):
+        """
+        功能：获取网格拓扑表的缓存，tri被替换时清空
+        """
+        topology = self.__dict__.get('_topology_cache')
+        if topology is None or topology['tri'] is not self.tri:
+            topology = {'tri': self.tri}
+            self.__dict__['_topology_cache'] = topology
+        return topology
+
+    def _build_edges(self):
+        """
+        功能：用排序一次性建立边相关的拓扑表
+        第i条半边是三角形第i个node对面的边（与FVCOM的NBE约定一致）
+        """
+        topology = self._topology()
+        tri = np.asarray(self.tri)
+        nele = len(tri)
+        half_edges = np.stack([tri[:, [1, 2]], tri[:, [2, 0]], tri[:, [0, 1]]],
+                              axis=1).reshape(-1, 2)
+        half_edges.sort(axis=1)
+        n_node = int(tri.max()) + 1 if nele else 0
+        key = half_edges[:, 0].astype(np.int64) * n_node + half_edges[:, 1]
+        order = np.argsort(key, kind='stable')
+        sorted_key = key[order]
+        # 相邻且相等的键表示两个三角形共用一条边
+        shared = np.flatnonzero(sorted_key[1:] == sorted_key[:-1])
+        first, second = order[shared], order[shared + 1]
+        neighbours = np.full(3 * nele, -1, dtype=int)
+        neighbours[first] = second // 3
+        neighbours[second] = first // 3
+        # 唯一的边，以及每条边两侧的三角形（边界边的第二个为-1）
+        new_edge = np.ones(len(sorted_key), dtype=bool)
+        new_edge[1:] = sorted_key[1:] != sorted_key[:-1]
+        edge_start = np.flatnonzero(new_edge)
+        edges = half_edges[order[edge_start]]
+        edge_elements = np.full([len(edges), 2], -1, dtype=int)
+        edge_elements[:, 0] = order[edge_start] // 3
+        edge_id = np.cumsum(new_edge) - 1
+        edge_elements[edge_id[shared + 1], 1] = second // 3
+        topology['element_neighbours'] = neighbours.reshape(nele, 3)
+        topology['edges'] = edges
+        topology['edge_elements'] = edge_elements
+        topology['boundary_edges'] = edges[edge_elements[:, 1] < 0]
+
+    @property
+    def node_elements(self):
+        """
+        功能：每个node周围的三角形，CSR格式，第i个node周围的三角形为indices[offsets[i]:offsets[i + 1]]
+        :return: offsets: shape（node + 1，）
+        :return: indices: 三角形下标，shape（nele * 3，）
+        """
+        topology = self._topology()
+        if 'node_elements' not in topology:
+            flat = np.asarray(self.tri).ravel()
+            indices = np.argsort(flat, kind='stable') // 3
+            counts = np.bincount(flat, minlength=len(self.lon))
+            offsets = np.zeros(len(counts) + 1, dtype=int)
+            np.cumsum(counts, out=offsets[1:])
+            topology['node_elements'] = (offsets, indices)
+        return topology['node_elements']
+
+    @property
+    def element_neighbours(self):
+        """
+        功能：每个三角形的相邻三角形，shape（nele，3），第i列是第i个node对面那条边的相邻三角形，边界为-1
+        """
+        if 'element_neighbours' not in self._topology():
+            self._build_edges()
+        return self._topology()['element_neighbours']
+
+    @property
+    def edges(self):
+        """
+        功能：网格中唯一的边，shape（nedge，2），每行两个node按从小到大排列
+        """
+        if 'edges' not in self._topology():
+            self._build_edges()
+        return self._topology()['edges']
+
+    @property
+    def edge_elements(self):
+        """
+        功能：每条边两侧的三角形，shape（nedge，2），边界边的第二个为-1
+        """
+        if 'edge_elements' not in self._topology():
+            self._build_edges()
+        return self._topology()['edge_elements']
+
+    @property
+    def boundary_edges(self):
+        """
+        功能：只属于一个三角形的边（陆地边界和开边界），shape（nboundary，2）
+        """
+        if 'boundary_edges' not in self._topology():
+            self._build_edges()
+        return self._topology()['boundary_edges']
+
+    def spatial_index(self, var='zeta'):
+        """
+        功能：获取网格点（或网格中心）的KD-tree，第一次使用时建立并缓存
+        KD-tree建立在单位球面的三维坐标上，所以近邻按照球面距离计算
+        :param var: 'u'，'v'表示网格中心，其他表示网格点
+        :return: scipy.spatial.cKDTree
+        """
         if var in ['u', 'v']:
-            lon = self.lonc[:]
-            lat = self.latc[:]
+            key, lon, lat = 'elem', self.lonc, self.latc
         else:
-            lon = self.lon[:]
-            lat = self.lat[:]
-        nold_id = np.argmin((lon - lon_station) ** 2 + (lat - lat_station) ** 2)
-        return nold_id
+            key, lon, lat = 'node', self.lon, self.lat
+        indexes = self.__dict__.setdefault('_spatial_indexes', {})
+        # 经纬度数组被替换（例如ReadData读取nc文件）时重新建立
+        if key not in indexes or indexes[key][0] is not lon or indexes[key][1] is not lat:
+            indexes[key] = (lon, lat, cKDTree(lonlat_to_xyz(lon, lat)))
+        return indexes[key][2]
 
+    def find_nearest_points(self, lons, lats, k=1, var='zeta',
+                            return_distance=False):
+        """
+        功能：批量查找离给定经纬度最近的k个网格点（或网格中心）
+        :param lons: 经度，可接受array
+        :param lats: 纬度，可接受array
+        :param k: 最近点的个数
+        :param var: 'u'，'v'表示查找网格中心，其他表示查找网格点
+        :param return_distance: True表示同时返回球面距离
+        :return: index: shape（n，）或者（n，k）
+        :return distance: 球面距离，单位为米，仅return_distance=True时返回
+        """
+        xyz = lonlat_to_xyz(lons, lats)
+        chord, index = self.spatial_index(var).query(xyz, k=k)
+        if not return_distance:
+            return index
+        distance = 2 * np.arcsin(np.clip(chord / 2, 0, 1)) * 6371000
+        return index, distance
 
+    def find_points_within(self, lon, lat, radius, var='zeta',
+                           return_distance=False):
+        """
+        功能：查找离给定经纬度球面距离在radius以内的所有网格点（或网格中心）
+        :param lon: 中心点经度
+        :param lat: 中心点纬度
+        :param radius: 半径，单位为米
+        :param var: 'u'，'v'表示查找网格中心，其他表示查找网格点
+        :param return_distance: True表示同时返回球面距离
+        :return: index: 升序排列的下标
+        :return distance: 球面距离，单位为米，仅return_distance=True时返回
+        """
+        xyz = lonlat_to_xyz(lon, lat)[0]
+        chord = 2 * np.sin(min(radius / 6371000, np.pi) / 2)
+        index = np.sort(np.asarray(
+            self.spatial_index(var).query_ball_point(xyz, chord), dtype=int))
+        if not return_distance:
+            return index
+        points = self.spatial_index(var).data[index]
+        chord = np.sqrt(np.sum((points - xyz) ** 2, axis=1))
+        distance = 2 * np.arcsin(np.clip(chord / 2, 0, 1)) * 6371000
+        return index, distance
+
+    def barycentric_weights(self, elems, lons, lats):
+        """
+        功能：计算点在给定三角形中的重心坐标（经纬度平面）
+        :param elems: 三角形下标，shape与lons相同，可以是（n，）或者（n，k）
+        :param lons: 点的经度
+        :param lats: 点的纬度
+        :return: weights: 三个node的权重，shape为elems.shape + (3,)
+        """
+        tri = self.tri[elems]
+        xa, xb, xc = (self.x[tri[..., i]] for i in range(3))
+        ya, yb, yc = (self.y[tri[..., i]] for i in range(3))
+        det = (yb - yc) * (xa - xc) + (xc - xb) * (ya - yc)
+        weights = np.empty(np.shape(elems) + (3,))
+        weights[..., 0] = ((yb - yc) * (lons - xc) + (xc - xb) * (lats - yc)) / det
+        weights[..., 1] = ((yc - ya) * (lons - xc) + (xa - xc) * (lats - yc)) / det
+        weights[..., 2] = 1 - weights[..., 0] - weights[..., 1]
+        return weights
+
+    def _element_circles(self):
+        """
+        功能：每个三角形在经纬度平面上的外接圆（圆心为三个node的平均，半径为到最远node的距离），
+             按半径分级（相邻两级相差2倍），每一级一个KD-tree，用于locate_points的兜底查找
+        :return: list，每个元素为（三角形下标，这一级的最大半径，KD-tree）
+        """
+        topology = self._topology()
+        circles = topology.get('element_circles')
+        if circles is None or circles[0] is not self.x or circles[1] is not self.y:
+            tri = np.asarray(self.tri)
+            x, y = np.asarray(self.x)[tri], np.asarray(self.y)[tri]
+            centre = np.column_stack([x.mean(axis=1), y.mean(axis=1)])
+            radius = np.sqrt((x - centre[:, :1]) ** 2 + (y - centre[:, 1:]) ** 2).max(axis=1)
+            level = np.floor(np.log2(np.maximum(radius, 1e-12) /
+                                     np.maximum(radius.min(), 1e-12))).astype(int)
+            levels = []
+            for i in np.unique(level):
+                elems = np.flatnonzero(level == i)
+                levels.append((elems, radius[elems].max(), cKDTree(centre[elems])))
+            circles = (self.x, self.y, levels)
+            topology['element_circles'] = circles
+        return circles[2]
+
+    def _search_elements(self, lons, lats, tol=1e-10, chunk_size=1024):
+        """
+        功能：在所有外接圆包含该点的三角形中查找点所在的三角形（不会漏掉网格内的点）
+        :return: elems: 所在三角形的下标，网格外的点为-1
+        :return: weights: 三个node的权重，shape（n，3），网格外的点为nan
+        """
+        elems = np.full(len(lons), -1, dtype=int)
+        weights = np.full([len(lons), 3], np.nan)
+        for start in range(0, len(lons), chunk_size):
+            points = np.column_stack([lons[start:start + chunk_size],
+                                      lats[start:start + chunk_size]])
+            point_id, cand = [], []
+            for level_elems, radius, tree in self._element_circles():
+                hits = tree.query_ball_point(points, radius * (1 + 1e-9) + tol)
+                counts = np.fromiter(map(len, hits), dtype=int, count=len(hits))
+                point_id.append(np.repeat(np.arange(len(points)), counts))
+                cand.append(level_elems[np.fromiter(chain.from_iterable(hits), dtype=int,
+                                                    count=counts.sum())])
+            point_id, cand = np.concatenate(point_id), np.concatenate(cand)
+            cand_weights = self.barycentric_weights(cand, points[point_id, 0],
+                                                    points[point_id, 1])
+            inside = (cand_weights >= -tol).all(axis=-1)
+            point_id, cand, cand_weights = point_id[inside], cand[inside], cand_weights[inside]
+            # 同一个点在多个三角形的边上时取下标最小的三角形
+            order = np.lexsort([cand, point_id])[::-1]
+            elems[start + point_id[order]] = cand[order]
+            weights[start + point_id[order]] = cand_weights[order]
+        return elems, weights
+
+    def locate_points(self, lons, lats, candidates=(8, 32, 128), tol=1e-10):
+        """
+        功能：批量查找点所在的三角形，并计算重心插值权重
+        先用网格中心的KD-tree找到最近的k个三角形作为候选，逐个判断是否包含该点，
+        没找到的点再用更大的k重新查找，最后一轮之后仍没找到的点（网格疏密变化大或者在网格外）
+        在外接圆包含该点的所有三角形中查找（_search_elements），所以-1只表示点在网格外
+        :param lons: 经度，可接受array
+        :param lats: 纬度，可接受array
+        :param candidates: 每一轮候选三角形的个数
+        :param tol: 判断点在三角形内部的容差
+        :return: elems: 所在三角形的下标，网格外的点为-1
+        :return: weights: 三个node的权重，shape（n，3），网格外的点为nan
+        """
+        lons = np.asarray(lons, dtype=float).ravel()
+        lats = np.asarray(lats, dtype=float).ravel()
+        elems = np.full(len(lons), -1, dtype=int)
+        weights = np.full([len(lons), 3], np.nan)
+        todo = np.arange(len(lons))
+        for k in candidates:
+            if len(todo) == 0:
+                break
+            k = min(k, self.nele)
+            cand = self.find_nearest_points(lons[todo], lats[todo], k=k, var='u')
+            cand = cand.reshape(len(todo), k)
+            cand_weights = self.barycentric_weights(cand, lons[todo, None],
+                                                    lats[todo, None])
+            inside = (cand_weights >= -tol).all(axis=-1)
+            found = inside.any(axis=1)
+            # 取离中心最近的包含该点的三角形
+            first = inside.argmax(axis=1)[found]
+            elems[todo[found]] = cand[found, first]
+            weights[todo[found]] = cand_weights[found, first]
+            todo = todo[~found]
+            if k == self.nele:
+                todo = todo[:0]
+                break
+        if len(todo):
+            elems[todo], weights[todo] = self._search_elements(lons[todo], lats[todo], tol)
+        return elems, weights
+
+    def interp_matrix(self, lons, lats, **kwargs):
+        """
+        功能：生成从网格点到任意点的线性插值稀疏矩阵，之后每个时刻的插值只需要一次矩阵乘法：
+        values_at_points = matrix @ values_on_nodes
+        :param lons: 经度，可接受array
+        :param lats: 纬度，可接受array
+        :param kwargs: 传给locate_points的参数
+        :return: matrix: scipy.sparse.csr_matrix，shape（n，node），网格外的点所在行为0
+        :return: inside: bool数组，表示点是否在网格内
+        """
+        elems, weights = self.locate_points(lons, lats, **kwargs)
+        inside = elems >= 0
+        rows = np.repeat(np.flatnonzero(inside), 3)
+        matrix = csr_matrix((weights[inside].ravel(),
+                             (rows, self.tri[elems[inside]].ravel())),
+                            shape=(len(elems), self.node))
+        return matrix, inside
+
+    def find_nearest_point(self, var, point):
+        """
+        功能：查找离某个站点最近的网格点（或网格中心）
+        :param var: 'u'，'v'表示查找网格中心，其他表示查找网格点
+        :param point: 站点的经纬度（lon，lat）
+        :return: nold_id: 最近点的下标
+        """
+        nold_id = self.find_nearest_points([point[0]], [point[1]], var=var)[0]
+        return nold_id
 
 
+def _write_dat_file(filename, headers, tables, chunk_rows=100000):
+    """
+    功能：写FVCOM的ASCII输入文件，每次对chunk_rows行做一次%格式化，而不是每行调用一次format
+    :param filename: 输出文件名
+    :param headers: 文件开头的若干行
+    :param tables: list，每个元素为（每行的格式，各列数组）
+    :param chunk_rows: 每次格式化的行数
+    """
+    with open(filename, 'w', buffering=2 ** 22) as f:
+        f.writelines(headers)
+        for fmt, columns in tables:
+            n_rows = len(columns[0])
+            for start in range(0, n_rows, chunk_rows):
+                rows = zip(*[np.asarray(column)[start:start + chunk_rows].tolist()
+                             for column in columns])
+                values = tuple(chain.from_iterable(rows))
+                f.write(fmt * (len(values) // len(columns)) % values)
@@ -6,8 +6,6 @@
 
 from fvcom_tools_packages.read_data import ReadData
 from fvcom_tools_packages.fvcom_plot import PlotFigure
-import pandas as pd
-import numpy as np
 from matplotlib.dates import date2num
 
 
@@ -18,17 +16,17 @@ class FvcomPost(object):
         self.wind_path = wind_path
 
     def calculate_model_zeta(self, station, start_time, end_time, figure=True, *args, **kwargs):
-        wind_zeta_data = ReadData(self.wind_path, types='fvcom',
-                                   variables=['time', 'zeta'])
-        tide_zeta_data = ReadData(self.tide_path, types='fvcom',
-                                   variables=['time', 'zeta'])
-        index = wind_zeta_data.find_nearest_point('zeta', station)
-        time_range = pd.date_range(start_time, end_time, freq='H')
-        time_stamp = date2num(time_range)
-        start_index = np.where(wind_zeta_data.data.time[:] == time_stamp[0])
-        end_index = np.where(wind_zeta_data.data.time[:] == time_stamp[-1])
-        zeta_wind = wind_zeta_data.data.zeta[start_index[0][0]: end_index[0][0]+1, index] - \
-                    tide_zeta_data.data.zeta[start_index[0][0]:end_index[0][0]+1, index]
+        # 只读取站点所在的一列和所选的时间范围
+        with ReadData(self.wind_path, types='fvcom', variables=['zeta'],
+                      lazy=True) as wind_zeta_data, \
+                ReadData(self.tide_path, types='fvcom', variables=['zeta'],
+                         lazy=True) as tide_zeta_data:
+            wind_table = wind_zeta_data.extract_stations([station], start_time, end_time,
+                                                         variables=['zeta'])
+            tide_table = tide_zeta_data.extract_stations([station], start_time, end_time,
+                                                         variables=['zeta'])
+        time_stamp = date2num(wind_table['time'])
+        zeta_wind = wind_table['zeta'].values - tide_table['zeta'].values
         if figure:
             zeta_fig = PlotFigure(cartesian=True)
             zeta_fig.plot_lines(time_stamp, zeta_wind, time_series=True, *args, **kwargs)
@@ -7,63 +7,107 @@
 import numpy as np
 from netCDF4 import Dataset, date2num
 from .fvcom_grid import Grid
-from .utily import PassiveStore
-from datetime import datetime
-from scipy.interpolate import griddata, interp1d
+from .utily import PassiveStore, inverse_barometer
+from .interp_weights import WeightStore, weights_key, delaunay_weights, \
+    bilinear_weights, nearest_weights, apply_weights_parallel, interp_in_time
+from .tide_synthesis import design_matrix, tidal_coefficients
+from .reconstructe_wind import TrackReconstructe, radial_blend_weight
+from datetime import datetime, timedelta
+import matplotlib.dates as pltdate
 
 
 class FvcomPrep(Grid):
 
-    def __init__(self, data_path=None):
+    def __init__(self, data_path=None, weight_dir=None):
+        """
+        参数
+        :param data_path: sms网格（.2dm）路径
+        :param weight_dir: 插值权重文件的目录，设置后权重会保存到硬盘，之后的运行直接读取
+        """
         if data_path is not None:
             super().__init__(data_path)
+        self.weight_store = WeightStore(weight_dir) if weight_dir else None
+
+    def get_interp_weights(self, src_lon, src_lat, dst_lon, dst_lat,
+                           method='linear'):
+        """
+        功能：获取从源点到目标点的插值权重，同一组（源点，目标点，方法）只计算一次，
+             设置了weight_dir时先从硬盘读取，计算后也保存到硬盘
+        :param src_lon: 源点经度
+        :param src_lat: 源点纬度
+        :param dst_lon: 目标点经度
+        :param dst_lat: 目标点纬度
+        :param method: 插值方法，'linear'为Delaunay三角形线性插值（与griddata一致），
+                       'bilinear'为规则网格的双线性插值，此时src_lon和src_lat为一维坐标轴，
+                       'nearest'为最近点插值（与griddata一致）
+        :return: InterpWeights
+        """
+        cache = self.__dict__.setdefault('_interp_weights', {})
+        key = weights_key(method, src_lon, src_lat, dst_lon, dst_lat)
+        store = getattr(self, 'weight_store', None)
+        if key not in cache and store is not None:
+            weights = store.load(key, method)
+            if weights is not None:
+                cache[key] = weights
+        if key not in cache:
+            if method == 'linear':
+                cache[key] = delaunay_weights(src_lon, src_lat, dst_lon, dst_lat)
+            elif method == 'bilinear':
+                cache[key] = bilinear_weights(src_lon, src_lat, dst_lon, dst_lat)
+            elif method == 'nearest':
+                cache[key] = nearest_weights(src_lon, src_lat, dst_lon, dst_lat)
+            else:
+                raise ValueError('不支持的插值方法：{}'.format(method))
+            if store is not None:
+                store.save(key, cache[key])
+        return cache[key]
+
+    @staticmethod
+    def _apply_weights(weights, values, workers=None, executor='process'):
+        """
+        功能：对所有时刻插值，workers不为None时沿时间维度并行
+        """
+        if workers:
+            return apply_weights_parallel(weights, values, workers=workers,
+                                          executor=executor)
+        return weights(values)
 
     def interp_temp_spatial(self, perp_lon, perp_lat, perp_time, perp_value,
                             interp_lon, interp_lat, interp_time,
-                            time_single=False, regular=True):
+                            time_single=False, regular=True, method='linear'):
         """
         对时空方向分别进行插值
         :param perp_data: 插值所用的数据，包括lon，lat，time，values
         :param interp_data: 待插值的数据，包括lon，lat，time
+        :param method: 空间插值方法，regular=True时可以用'bilinear'
         :return: interped_data: 插值结果
         """
-        # 先对空间进行插值
-
-        perp_time_num = len(perp_time)
-        interp_spatial_num = len(interp_lon)
-        interped_data_time = np.ones([perp_time_num, interp_spatial_num])
-        if regular:
-            X, Y = np.meshgrid(perp_lon, perp_lat)
-            for itime in range(perp_time_num):
-                interped_tmp = griddata((X.ravel(), Y.ravel()),
-                                        perp_value[itime, :, :].ravel(),
-                                        (interp_lon, interp_lat))
-                interped_data_time[itime, :] = interped_tmp
-        else:
-            X, Y = perp_lon, perp_lat
-            for itime in range(perp_time_num):
-                interped_tmp = griddata((X, Y), perp_value[itime, :],
-                                        (interp_lon, interp_lat))
-                interped_data_time[itime, :] = interped_tmp
-        # 再对时间进行插值
-        if time_single:
-            interped_data = np.ones(interp_spatial_num)
+        # 先对空间进行插值（权重只计算一次，所有时刻一起做矩阵乘法）
+        if regular and method == 'bilinear':
+            weights = self.get_interp_weights(perp_lon, perp_lat, interp_lon,
+                                              interp_lat, method='bilinear')
         else:
-            interped_data = np.ones([len(interp_time), interp_spatial_num])
-        for ilon in range(interp_spatial_num):
-            func = interp1d(perp_time, interped_data_time[:, ilon])
-            if time_single:
-                interped_tmp = func(interp_time[ilon])
-                interped_data[ilon] = interped_tmp
+            if regular:
+                X, Y = np.meshgrid(perp_lon, perp_lat)
             else:
-                interped_tmp = func(interp_time[ilon])
-                interped_data[:, ilon] = interped_tmp
+                X, Y = perp_lon, perp_lat
+            weights = self.get_interp_weights(np.ravel(X), np.ravel(Y),
+                                              interp_lon, interp_lat)
+        interped_data_time = weights(perp_value)
+        # 再对时间进行插值（所有点一起计算）
+        interped_data = interp_in_time(perp_time, interped_data_time,
+                                       interp_time, per_point=time_single)
         return interped_data
 
-    def interp_surface_forcing(self, data):
+    def interp_surface_forcing(self, data, method='linear', workers=None,
+                               executor='process'):
         """
         功能：插值表面强迫数据
+        源网格的三角化和插值权重只计算一次，u10和v10合并成一次稀疏矩阵乘法
         :param data: 一个数据类，包含u10, v10, slp等
+        :param method: 'linear'为Delaunay三角形线性插值，'bilinear'为规则经纬度网格的双线性插值（ERA5、NCEP）
+        :param workers: 并行的进程（线程）数，None表示串行
+        :param executor: 并行方式，'process'或者'thread'，参考apply_weights_parallel
         :return:
         """
         print("正在进行插值……")
@@ -73,29 +117,31 @@ class FvcomPrep(Grid):
         uwnd_final = np.zeros([time_length, self.nele], dtype='f')
         vwnd_final = np.zeros([time_length, self.nele], dtype='f')
         slp_final = np.zeros([time_length, self.node], dtype='f')
-        for i in range(time_length):
+        if method == 'bilinear':
+            src_lon, src_lat = data.lon, data.lat
+        else:
             LON, LAT = np.meshgrid(data.lon, data.lat)
-            if 'u10' in data:
-                uwind_tmp = griddata((LON.ravel(), LAT.ravel()),
-                                     data.u10[i, :, :].ravel(),
-                                     (self.lonc, self.latc))
-                if len(np.argwhere(np.isnan(uwind_tmp))) > 0:
-                    raise ValueError('存在NAN值')
-                uwnd_final[i, :] = uwind_tmp
-            if 'v10' in data:
-                vwind_tmp = griddata((LON.ravel(), LAT.ravel()),
-                                     data.v10[i, :, :].ravel(),
-                                     (self.lonc, self.latc))
-                if len(np.argwhere(np.isnan(vwind_tmp))) > 0:
-                    raise ValueError('存在NAN值')
-                vwnd_final[i, :] = vwind_tmp
-            if 'slp' in data:
-                slf_tmp = griddata((LON.ravel(), LAT.ravel()),
-                                   data.slp[i, :, :].ravel(),
-                                   (self.lon, self.lat))
-                if len(np.argwhere(np.isnan(slf_tmp))) > 0:
-                    raise ValueError('存在NAN值')
-                slp_final[i, :] = slf_tmp
+            src_lon, src_lat = LON.ravel(), LAT.ravel()
+        wind_names = [name for name in ['u10', 'v10'] if name in data]
+        if wind_names:
+            elem_weights = self.get_interp_weights(src_lon, src_lat, self.lonc,
+                                                   self.latc, method=method)
+            wind = np.concatenate([getattr(data, name)[:time_length]
+                                   for name in wind_names])
+            wind_tmp = self._apply_weights(elem_weights, wind, workers, executor)
+            if np.isnan(wind_tmp).any():
+                raise ValueError('存在NAN值')
+            for i, name in enumerate(wind_names):
+                wind_final = uwnd_final if name == 'u10' else vwnd_final
+                wind_final[:] = wind_tmp[i * time_length:(i + 1) * time_length]
+        if 'slp' in data:
+            node_weights = self.get_interp_weights(src_lon, src_lat, self.lon,
+                                                   self.lat, method=method)
+            slp_tmp = self._apply_weights(node_weights, data.slp[:time_length],
+                                          workers, executor)
+            if np.isnan(slp_tmp).any():
+                raise ValueError('存在NAN值')
+            slp_final[:] = slp_tmp
         setattr(forcing_data, 'uwnd', uwnd_final)
         setattr(forcing_data, 'vwnd', vwnd_final)
         setattr(forcing_data, 'slp', slp_final)
@@ -103,6 +149,88 @@ class FvcomPrep(Grid):
         print("插值共花了{:d}秒".format((t_end - t_start).seconds))
         return forcing_data
 
+    def obc_pressure(self, pressure, obc_nodes, method='nearest'):
+        """
+        功能：将气压插值到开边界点（只做空间插值，所有时刻一起计算）
+        :param pressure: 气压数据类，包括time和slp。
+                         再分析数据（ecmwf、ncep）：lon，lat为一维坐标轴，slp为（time，lat，lon）；
+                         fvcom强迫文件（ReadData(types='fvcom').data）：slp为（time，node），直接取开边界点
+        :param obc_nodes: 开边界点的编号（从1开始，与obc文件中的obc_nodes一致）
+        :param method: 再分析数据的空间插值方法，参考get_interp_weights
+        :return: 开边界点上的气压，shape（time，nobc）
+        """
+        obc_index = np.asarray(obc_nodes, dtype=int) - 1
+        slp = pressure.slp
+        if np.ndim(slp) == 2:
+            return np.asarray(slp[:, obc_index])
+        if method == 'bilinear':
+            src_lon, src_lat = pressure.lon, pressure.lat
+        else:
+            LON, LAT = np.meshgrid(pressure.lon, pressure.lat)
+            src_lon, src_lat = LON.ravel(), LAT.ravel()
+        weights = self.get_interp_weights(src_lon, src_lat, self.lon[obc_index],
+                                          self.lat[obc_index], method=method)
+        obc_slp = weights(slp)
+        if np.isnan(obc_slp).any():
+            raise ValueError('存在NAN值')
+        return obc_slp
+
+    def iter_inverse_barometer_obc(self, chunks, pressure, method='nearest',
+                                   p_ref=101325.0):
+        """
+        功能：逐块给开边界水位加上逆气压效应
+        气压的空间插值只计算一次，每块的时间插值所有开边界点一起计算
+        :param chunks: 可迭代对象，每块包含time，obc，elev（例如ReadData.iter_obc_nc）
+        :param pressure: 气压数据类，参考obc_pressure
+        :param method: 再分析数据的空间插值方法，参考get_interp_weights
+        :param p_ref: 参考气压，单位为Pa
+        :return: 生成器，每次返回一块调整后的数据（time，obc，elev）
+        """
+        obc_slp = None
+        for chunk in chunks:
+            if obc_slp is None:
+                obc_slp = self.obc_pressure(pressure, chunk.obc, method=method)
+            slp = interp_in_time(pressure.time, obc_slp, chunk.time)
+            adjusted = PassiveStore()
+            setattr(adjusted, 'time', chunk.time)
+            setattr(adjusted, 'obc', chunk.obc)
+            setattr(adjusted, 'elev', chunk.elev + inverse_barometer(slp, p_ref))
+            yield adjusted
+
+    def iter_tidal_obc(self, constituents, amplitude, phase, start, end,
+                       interval=timedelta(minutes=10), chunk_size=4320,
+                       nodal=True, z0=0.0):
+        """
+        功能：由开边界点的调和常数逐块合成潮位，用于write_obc_nc_chunks
+        例如：prep.write_obc_nc_chunks(ncfile, prep.iter_tidal_obc(['M2', 'S2'], amp, pha, start, end))
+        :param constituents: 分潮名称，list，参考tide_synthesis.CONSTITUENTS
+        :param amplitude: 振幅（米），shape（C，nobc），列的顺序与open_boundary_nodes一致
+        :param phase: 格林尼治迟角（度），shape（C，nobc）
+        :param start: 开始时间，datetime（UTC）
+        :param end: 结束时间，datetime（UTC），包括在内
+        :param interval: 时间间隔，timedelta
+        :param chunk_size: 每块的时间步数
+        :param nodal: 是否做交点订正
+        :param z0: 平均水位
+        :return: 生成器，每次返回一块数据（time，obc，elev）
+        """
+        amplitude = np.asarray(amplitude, dtype=float)
+        if amplitude.shape != (len(constituents), self.obc):
+            raise ValueError('振幅和迟角的shape应为（分潮数，开边界点数）')
+        coefficients = tidal_coefficients(amplitude, phase)
+        step = interval.total_seconds() / 86400
+        time_length = int(np.floor((end - start).total_seconds() / 86400 / step + 1e-9)) + 1
+        mjd_start = date2num(start, units='days since 1858-11-17 00:00:00')
+        num_start = pltdate.date2num(start)
+        for first in range(0, time_length, chunk_size):
+            offset = np.arange(first, min(first + chunk_size, time_length)) * step
+            chunk = PassiveStore()
+            setattr(chunk, 'time', num_start + offset)
+            setattr(chunk, 'obc', self.open_boundary_nodes + 1)
+            setattr(chunk, 'elev', design_matrix(mjd_start + offset, constituents,
+                                                 nodal) @ coefficients + z0)
+            yield chunk
+
     def write_obc_nc(self, ncfile, ptime, zeta, *args, **kwargs):
         """
         功能：将obc数据写入到nc文件中
@@ -113,25 +241,61 @@ class FvcomPrep(Grid):
         :param kwargs:
         :return:
         """
+        with self._create_obc_nc(ncfile) as obc_ncfile:
+            self._write_obc_data(obc_ncfile, ptime, zeta)
+
+    def write_obc_nc_chunks(self, ncfile, chunks):
+        """
+        功能：将obc数据逐块追加写入nc文件（沿着time维度），内存只与每块的大小有关
+        例如：prep.write_obc_nc_chunks(ncfile, prep.iter_inverse_barometer_obc(reader.iter_obc_nc(720), slp_data))
+        :param ncfile: 输出nc文件
+        :param chunks: 可迭代对象，每块包含time（matplotlib的时间数字）以及elev
+        :return: time_length: 写入的时间步数
+        """
+        time_length = 0
+        with self._create_obc_nc(ncfile) as obc_ncfile:
+            for chunk in chunks:
+                ptime = pltdate.num2date(chunk.time)
+                self._write_obc_data(obc_ncfile, ptime, chunk.elev,
+                                     start=time_length)
+                time_length += len(ptime)
+        return time_length
+
+    def _create_obc_nc(self, ncfile):
+        """
+        功能：创建obc的nc文件，并写入开边界点编号
+        :param ncfile: 输出nc文件
+        :return: WriteForcing
+        """
         globals = {'type': 'FVCOM TIME SERIES ELEVATION FORCING FILE',
                    'title': 'JULIAN FVCOM TIDAL FORCING DATA CREATED FROM OLD FILE TYPE: anything',
                    'history': "File created using {} with write_obc_nc from python".format(
                        datetime.now().strftime('%Y-%m-%d %H:%M:%S'))}
         # 定义维度
-        dims = {'nobc': self.obc, 'time': 0, 'DateStrLen': 26}
-
-        with WriteForcing(ncfile, dims, globle_attributes=globals,
-                          format='NETCDF3_64BIT') as obc_ncfile:
-            atts = {'long_name': 'Open Boundary Node Number',
-                    'grid': 'obc_grid'}
-            obc_ncfile.add_variable('obc_nodes', self.open_boundary_nodes + 1,
-                                    ['nobc'],
-                                    attributes=atts, format='i')
-            # 写入时间
-            obc_ncfile.write_fvcom_time(ptime)
-            atts = {'long_name': 'Open Boundary Elevation', 'units': 'meters'}
-            obc_ncfile.add_variable('elevation', zeta, ['time', 'nobc'],
-                                    attributes=atts)
+        dims = {'nobc': self.obc, 'time': 0, 'DateStrLen': 26, 'scalar': 1}
+
+        obc_ncfile = WriteForcing(ncfile, dims, globle_attributes=globals,
+                                  format='NETCDF3_64BIT')
+        atts = {'long_name': 'Open Boundary Node Number',
+                'grid': 'obc_grid'}
+        obc_ncfile.add_variable('obc_nodes', self.open_boundary_nodes + 1,
+                                ['nobc'],
+                                attributes=atts, format='i')
+        return obc_ncfile
+
+    def _write_obc_data(self, obc_ncfile, ptime, zeta, start=None):
+        """
+        功能：写入时间和开边界水位
+        :param obc_ncfile: WriteForcing
+        :param ptime: 时间变量，格式为datetime
+        :param zeta: 开边界水位，shape（time，nobc）
+        :param start: 写入的起始时间下标，None表示从头写入
+        """
+        # 写入时间
+        obc_ncfile.write_fvcom_time(ptime, start=start)
+        atts = {'long_name': 'Open Boundary Elevation', 'units': 'meters'}
+        obc_ncfile.add_variable('elevation', zeta, ['time', 'nobc'],
+                                attributes=atts, start=start)
 
     def write_surface_forcing(self, ncfile, ptime, forcing_data, **kwargs):
         """
@@ -139,9 +303,187 @@ class FvcomPrep(Grid):
         :param ncfile: 输出nc文件
         :param ptime:  时间变量，格式为datetime
         :param forcing_data: 表面驱动数据
-        :param kwargs:
+        :param kwargs: 输出格式和压缩的设置，参考surface_forcing_ncopts
         :return:
         """
+        with self._create_surface_forcing(ncfile, **kwargs) as surf_ncfile:
+            self._write_surface_data(surf_ncfile, ptime, forcing_data)
+
+    def iter_surface_forcing(self, chunks, method='linear', workers=None,
+                             executor='process'):
+        """
+        功能：逐块插值表面强迫数据
+        :param chunks: 可迭代对象，每块是包含lon，lat，time，u10，v10，slp的数据类（例如ReadData.iter_ecmwf_data）
+        :param method: 插值方法，参考interp_surface_forcing
+        :param workers: 并行的进程（线程）数，None表示串行
+        :param executor: 并行方式，'process'或者'thread'
+        :return: 生成器，每次返回网格上的一块数据（time，uwnd，vwnd，slp）
+        """
+        for chunk in chunks:
+            forcing_data = self.interp_surface_forcing(chunk, method=method,
+                                                       workers=workers,
+                                                       executor=executor)
+            setattr(forcing_data, 'time', chunk.time)
+            yield forcing_data
+
+    def iter_blended_forcing(self, chunks, track, radius_inner=300e3,
+                             radius_outer=600e3, method='linear', c1=0.8,
+                             c2=0.8, track_method='linear', workers=None,
+                             executor='process', **kwargs):
+        """
+        功能：逐块将参数化台风模型的气压场和风场与再分析数据（ERA5等）按到台风中心的距离加权合成
+        合成场 = weight * 参数化场 + (1 - weight) * 背景场，weight参考radial_blend_weight
+        插值权重和网格的空间索引只建立一次，每块只计算radius_outer以内的点
+        例如：prep.write_surface_forcing_chunks(ncfile, prep.iter_blended_forcing(reader.iter_ecmwf_data(24), track))
+        :param chunks: 可迭代对象，每块是包含lon，lat，time，u10，v10，slp的数据类（例如ReadData.iter_ecmwf_data）
+        :param track: 台风路径数据类，包括tp_time，tp_lon，tp_lat，tp_press，tp_vmax，路径时间范围以外只使用背景场
+        :param radius_inner: 完全使用参数化场的半径，单位为米
+        :param radius_outer: 完全使用背景场的半径，单位为米
+        :param method: 背景场的插值方法，参考interp_surface_forcing
+        :param c1: 经验参数，参考Reconstructe.synthesis_windfield
+        :param c2: 经验参数
+        :param track_method: 路径插值到背景场时间的方法，参考interp_track
+        :param workers: 背景场插值的并行进程（线程）数，None表示串行
+        :param executor: 并行方式，'process'或者'thread'
+        :param kwargs: 参数化模型的设置（P1，theta，Rk等），参考TrackReconstructe
+        :return: 生成器，每次返回网格上的一块数据（time，uwnd，vwnd，slp）
+        """
+        engine = TrackReconstructe.from_grid(track, self, **kwargs)
+        for chunk in chunks:
+            forcing_data = self.interp_surface_forcing(chunk, method=method,
+                                                       workers=workers,
+                                                       executor=executor)
+            setattr(forcing_data, 'time', chunk.time)
+            inside = np.nonzero((chunk.time >= engine.time[0]) &
+                                (chunk.time <= engine.time[-1]))[0]
+            if len(inside):
+                chunk_engine = engine.at_times(chunk.time[inside],
+                                               method=track_method)
+                updates = chunk_engine.iter_sparse(radius_outer, c1=c1, c2=c2)
+                for it, update in zip(inside, updates):
+                    weight = radial_blend_weight(update.node_distance,
+                                                 radius_inner, radius_outer)
+                    background = forcing_data.slp[it, update.node_index]
+                    forcing_data.slp[it, update.node_index] = \
+                        weight * update.slp + (1 - weight) * background
+                    weight = radial_blend_weight(update.elem_distance,
+                                                 radius_inner, radius_outer)
+                    for name in ['uwnd', 'vwnd']:
+                        field = getattr(forcing_data, name)
+                        background = field[it, update.elem_index]
+                        # 台风中心（r=0）处梯度风没有定义，取为0
+                        wind = np.nan_to_num(getattr(update, name))
+                        field[it, update.elem_index] = \
+                            weight * wind + (1 - weight) * background
+            yield forcing_data
+
+    def write_surface_forcing_chunks(self, ncfile, chunks, **kwargs):
+        """
+        功能：将网格上的表面强迫数据逐块追加写入nc文件（沿着time维度），内存只与每块的大小有关
+        例如：prep.write_surface_forcing_chunks(ncfile, prep.iter_surface_forcing(reader.iter_ecmwf_data(24)))
+        :param ncfile: 输出nc文件
+        :param chunks: 可迭代对象，每块包含time（matplotlib的时间数字）以及uwnd，vwnd，slp
+        :param kwargs: 输出格式和压缩的设置，参考surface_forcing_ncopts
+        :return: time_length: 写入的时间步数
+        """
+        time_length = 0
+        with self._create_surface_forcing(ncfile, **kwargs) as surf_ncfile:
+            for chunk in chunks:
+                ptime = pltdate.num2date(chunk.time)
+                self._write_surface_data(surf_ncfile, ptime, chunk,
+                                         start=time_length)
+                time_length += len(ptime)
+        return time_length
+
+    def patch_surface_forcing(self, ncfile, time_index, forcing_data):
+        """
+        功能：在已有的表面强迫nc文件中，直接覆盖指定时刻的uwind_speed，vwind_speed，air_pressure，
+             其他时刻不读也不写
+        :param ncfile: 已有的表面强迫nc文件
+        :param time_index: 需要覆盖的时间下标，int或者数组
+        :param forcing_data: 对应时刻的数据，包含uwnd，vwnd，slp（至少一个），shape（len(time_index)，n）
+        :return:
+        """
+        time_index = np.atleast_1d(time_index).astype(int)
+        order = np.argsort(time_index, kind='stable')
+        sorted_index = time_index[order]
+        # 连续的下标合并成一次写入
+        breaks = np.flatnonzero(np.diff(sorted_index) != 1) + 1
+        runs = np.split(np.arange(len(sorted_index)), breaks)
+        with WriteForcing(ncfile, mode='a') as surf_ncfile:
+            time_length = len(surf_ncfile.nc.dimensions['time'])
+            if len(sorted_index) and (sorted_index[0] < 0 or sorted_index[-1] >= time_length):
+                raise IndexError('时间下标超出文件的时间范围（0-{}）'.format(time_length - 1))
+            for name, var_name in [('uwnd', 'uwind_speed'), ('vwnd', 'vwind_speed'),
+                                   ('slp', 'air_pressure')]:
+                if name not in forcing_data:
+                    continue
+                values = np.asarray(getattr(forcing_data, name)).reshape(len(time_index), -1)
+                var = surf_ncfile.nc.variables[var_name]
+                for run in runs:
+                    start = sorted_index[run[0]]
+                    var[start:start + len(run)] = values[order[run]]
+
+    def extend_surface_forcing(self, ncfile, ptime, forcing_data):
+        """
+        功能：在已有的表面强迫nc文件末尾追加时刻（沿time维度），已有的数据不读也不写
+        :param ncfile: 已有的表面强迫nc文件
+        :param ptime: 追加的时间，格式为datetime
+        :param forcing_data: 追加的表面驱动数据
+        :return: time_length: 追加后文件的时间步数
+        """
+        with WriteForcing(ncfile, mode='a') as surf_ncfile:
+            start = len(surf_ncfile.nc.dimensions['time'])
+            self._write_surface_data(surf_ncfile, ptime, forcing_data, start=start)
+            return len(surf_ncfile.nc.dimensions['time'])
+
+    def surface_forcing_ncopts(self, nc_format='NETCDF3_64BIT', complevel=4,
+                               chunking='time', time_chunk=720,
+                               space_chunk=256, least_significant_digit=None):
+        """
+        功能：生成表面强迫变量（uwind_speed，vwind_speed，air_pressure）的压缩和分块设置
+        :param nc_format: nc文件格式，只有NETCDF4格式才会压缩
+        :param complevel: zlib压缩等级（1-9），None表示不压缩
+        :param chunking: 'time'表示每个时刻一块（模式按时刻读取），'space'表示每块包含time_chunk个时刻、
+                         space_chunk个点（分析单点时间序列）
+        :param time_chunk: chunking='space'时每块的时间步数
+        :param space_chunk: chunking='space'时每块的点数
+        :param least_significant_digit: 保留的小数位数（量化后压缩率更高），可以是int或者{变量名: int}
+        :return: variable_ncopts: {变量名: ncopts}
+        """
+        if not nc_format.startswith('NETCDF4'):
+            return {}
+        variable_ncopts = {}
+        for name, length in [('uwind_speed', self.nele), ('vwind_speed', self.nele),
+                             ('air_pressure', self.node)]:
+            if chunking == 'time':
+                chunksizes = (1, length)
+            elif chunking == 'space':
+                chunksizes = (time_chunk, min(space_chunk, length))
+            else:
+                raise ValueError('不支持的chunking：{}'.format(chunking))
+            ncopts = {'chunksizes': chunksizes}
+            if complevel:
+                ncopts.update({'zlib': True, 'complevel': complevel,
+                               'shuffle': True})
+            if isinstance(least_significant_digit, dict):
+                digit = least_significant_digit.get(name)
+            else:
+                digit = least_significant_digit
+            if digit is not None:
+                ncopts['least_significant_digit'] = digit
+            variable_ncopts[name] = ncopts
+        return variable_ncopts
+
+    def _create_surface_forcing(self, ncfile, nc_format='NETCDF3_64BIT',
+                                **kwargs):
+        """
+        功能：创建表面强迫nc文件，并写入网格
+        :param ncfile: 输出nc文件
+        :param nc_format: nc文件格式，默认为NETCDF3_64BIT，NETCDF4可以压缩
+        :param kwargs: 压缩和分块的设置，参考surface_forcing_ncopts
+        :return: WriteForcing
+        """
         # 定义全局变量
         globals = {'type': "FVCOM Surface Forcing input DATA VERSION :",
                    'title': "FVCOM Grid Forcing Data file",
@@ -156,43 +498,54 @@ class FvcomPrep(Grid):
         dims = {'nele': self.nele, 'node': self.node, 'three': 3,
                 'time': 0, 'DateStrLen': 26, 'scalar': 1}
 
-        with WriteForcing(ncfile, dims, globle_attributes=globals,
-                          format='NETCDF3_64BIT') as surf_ncfile:
-            # 写入网格
-            print('写入网格中……')
-            grid = Grid(self.grid_path)
-            surf_ncfile.write_fvcom_grid(grid)
-            # 写入时间
-            print('写入时间中……')
-            surf_ncfile.write_fvcom_time(ptime)
-            # 写入表明强迫数据
-            if 'uwnd' in forcing_data:
-                atts = {'long_name': 'Eastward Wind Speed',
-                        'standard_name': 'Wind Speed',
-                        'units': 'm/s',
-                        'gird': 'fvcom_grid',
-                        'type': 'data'}
-                surf_ncfile.add_variable('uwind_speed', forcing_data.uwnd,
-                                         ['time', 'nele'],
-                                         attributes=atts)
-            if 'vwnd' in forcing_data:
-                atts = {'long_name': 'Northward Wind Speed',
-                        'standard_name': 'Wind Speed',
-                        'units': 'm/s',
-                        'gird': 'fvcom_grid',
-                        'type': 'data'}
-                surf_ncfile.add_variable('vwind_speed', forcing_data.vwnd,
-                                         ['time', 'nele'],
-                                         attributes=atts)
-            if 'slp' in forcing_data:
-                atts = {'long_name': 'Surface air pressure',
-                        'units': 'Pa',
-                        'gird': 'fvcom_grid',
-                        'coordinate': self.nativeCoords,
-                        'type': 'data'}
-                surf_ncfile.add_variable('air_pressure', forcing_data.slp,
-                                         ['time', 'node'],
-                                         attributes=atts)
+        variable_ncopts = self.surface_forcing_ncopts(nc_format, **kwargs)
+        surf_ncfile = WriteForcing(ncfile, dims, globle_attributes=globals,
+                                   variable_ncopts=variable_ncopts,
+                                   format=nc_format)
+        # 写入网格
+        print('写入网格中……')
+        surf_ncfile.write_fvcom_grid(self)
+        return surf_ncfile
+
+    def _write_surface_data(self, surf_ncfile, ptime, forcing_data, start=None):
+        """
+        功能：写入时间和表面强迫数据
+        :param surf_ncfile: WriteForcing
+        :param ptime: 时间变量，格式为datetime
+        :param forcing_data: 表面驱动数据
+        :param start: 写入的起始时间下标，None表示从头写入
+        """
+        # 写入时间
+        print('写入时间中……')
+        surf_ncfile.write_fvcom_time(ptime, start=start)
+        # 写入表明强迫数据
+        if 'uwnd' in forcing_data:
+            atts = {'long_name': 'Eastward Wind Speed',
+                    'standard_name': 'Wind Speed',
+                    'units': 'm/s',
+                    'gird': 'fvcom_grid',
+                    'type': 'data'}
+            surf_ncfile.add_variable('uwind_speed', forcing_data.uwnd,
+                                     ['time', 'nele'],
+                                     attributes=atts, start=start)
+        if 'vwnd' in forcing_data:
+            atts = {'long_name': 'Northward Wind Speed',
+                    'standard_name': 'Wind Speed',
+                    'units': 'm/s',
+                    'gird': 'fvcom_grid',
+                    'type': 'data'}
+            surf_ncfile.add_variable('vwind_speed', forcing_data.vwnd,
+                                     ['time', 'nele'],
+                                     attributes=atts, start=start)
+        if 'slp' in forcing_data:
+            atts = {'long_name': 'Surface air pressure',
+                    'units': 'Pa',
+                    'gird': 'fvcom_grid',
+                    'coordinate': getattr(self, 'nativeCoords', 'spherical'),
+                    'type': 'data'}
+            surf_ncfile.add_variable('air_pressure', forcing_data.slp,
+                                     ['time', 'node'],
+                                     attributes=atts, start=start)
 
 
 class WriteForcing(object):
@@ -200,15 +553,21 @@ class WriteForcing(object):
     功能：创建nc文件，用于写入FVCOM输入文件
     """
 
-    def __init__(self, filename, dimensions, globle_attributes, **kwargs):
+    def __init__(self, filename, dimensions=None, globle_attributes=None,
+                 variable_ncopts=None, mode='w', **kwargs):
         """
         参数
         :param filename: 输出的nc文件名（加路径）
-        :param dimensions: nc文件的dimensions
-        :param globle_attributes: nc文件的globle attributes
+        :param dimensions: nc文件的dimensions，mode='a'时不需要
+        :param globle_attributes: nc文件的globle attributes，mode='a'时不需要
+        :param variable_ncopts: dict，变量名对应创建变量时的option（压缩、分块等），用于add_variable
+        :param mode: 'w'表示新建文件，'a'表示打开已有的文件，修改或者追加数据
         :param kwargs:
         """
-        self.nc = Dataset(filename, 'w', **kwargs)
+        self.nc = Dataset(filename, mode, **kwargs)
+        self.variable_ncopts = variable_ncopts or {}
+        if mode == 'a':
+            return
 
         for dimension in dimensions:
             self.nc.createDimension(dimension, dimensions[dimension])
@@ -218,31 +577,42 @@ class WriteForcing(object):
                 setattr(self.nc, attribute, globle_attributes[attribute])
 
     def add_variable(self, name, data, dimensions, attributes=None,
-                     format='f4'):
+                     format='f4', start=None, ncopts=None):
         """
-        功能： 添加变量到nc文件中
+        功能： 添加变量到nc文件中，变量已经存在时直接写入数据
         :param name: 变量名
         :param data: 变量值
         :param dimensions: 变量维度
         :param attributes: 变量属性
         :param format:     变量数据格式
-        :param ncopts:  dict的option可以被用于创建变量
+        :param start: 沿第一个维度（一般是time）写入的起始下标，None表示写入整个变量
+        :param ncopts:  dict的option可以被用于创建变量，例如zlib，complevel，shuffle，chunksizes，
+                        least_significant_digit（仅NETCDF4格式），None表示使用variable_ncopts中的设置
         :return:
         """
-        if isinstance(dimensions, list):
-            dimensions = tuple(dimensions)
-        var = self.nc.createVariable(name, format, dimensions)
-        if attributes:
-            for attribute in attributes:
-                setattr(var, attribute, attributes[attribute])
+        if name in self.nc.variables:
+            var = self.nc.variables[name]
+        else:
+            if isinstance(dimensions, list):
+                dimensions = tuple(dimensions)
+            if ncopts is None:
+                ncopts = self.variable_ncopts.get(name, {})
+            var = self.nc.createVariable(name, format, dimensions, **ncopts)
+            if attributes:
+                for attribute in attributes:
+                    setattr(var, attribute, attributes[attribute])
 
-        var[:] = data
+        if start is None:
+            var[:] = data
+        else:
+            var[start:start + len(data)] = data
         # setattr(self, name, var)
 
-    def write_fvcom_time(self, time, **kwargs):
+    def write_fvcom_time(self, time, start=None, **kwargs):
         """
         功能：写入fvcom时间到nc文件中
         :param time: 时间变量，datetime格式
+        :param start: 写入的起始时间下标，None表示从头写入
         :param kwargs:
         :return:
         """
@@ -251,38 +621,42 @@ class WriteForcing(object):
         mjd = date2num(time, units='days since 1858-11-17 00:00:00')
         Itime = np.floor(mjd)  # Julian day的整数部分
         Itime2 = (mjd - Itime) * 24 * 60 * 60 * 1000  # 从0点开始的毫秒数
-        Times = [t.strftime('%Y-%m-%dT%H:%M:%S.%f') for t in time]
+        # 转为（time，DateStrLen）的字符数组，新建和追加写入都可以直接赋值
+        Times = np.array([list(t.strftime('%Y-%m-%dT%H:%M:%S.%f')) for t in time],
+                         dtype='S1').reshape(len(time), 26)
 
         # nprocs
         atts = {'long_name': 'number of processors'}
         self.add_variable('nprocs', 1, ['scalar'], attributes=atts, format='i')
         # iint
         atts = {'long_name': 'internal mode iteration number'}
-        self.add_variable('iint', np.arange(len(time)), ['time'],
-                          attributes=atts, format='i')
+        self.add_variable('iint', np.arange(len(time)) + (start or 0), ['time'],
+                          attributes=atts, format='i', start=start)
         # time
         atts = {'long_name': 'time',
                 'units': 'days since 1858-11-17 00:00:00',
                 'format': 'modified julian day (MJD)',
                 'time_zone': 'UTC'}
-        self.add_variable('time', mjd, ['time'], attributes=atts, format='f')
+        self.add_variable('time', mjd, ['time'], attributes=atts, format='f',
+                          start=start)
         # Itime
         atts = {'units': 'days since 1858-11-17 00:00:00',
                 'format': 'modified julian day (MJD)',
                 'time_zone': 'UTC'}
-        self.add_variable('Itime', Itime, ['time'], attributes=atts, format='i')
+        self.add_variable('Itime', Itime, ['time'], attributes=atts, format='i',
+                          start=start)
         # Itime2
         atts = {'units': 'msec since 00:00:00',
                 'time_zone': 'UTC',
                 'long_name': 'time'}
         self.add_variable('Itime2', Itime2, ['time'], attributes=atts,
-                          format='i')
+                          format='i', start=start)
         # Times
         atts = {'long_name': 'Calendar Date',
                 'format': 'String: Calendar Time',
                 'time_zone': 'UTC'}
         self.add_variable('Times', Times, ['time', 'DateStrLen'], format='c',
-                          attributes=atts)
+                          attributes=atts, start=start)
 
     def write_fvcom_grid(self, grid, native_coordinates='spherical', **kwargs):
         """
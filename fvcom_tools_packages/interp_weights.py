@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+# __NAME__   = interp_weights.py
+# __AUTHOR__ = 'QIU ZHOU'
+# __TIME__   = 2019/8/8 9:30
+
+import os
+import hashlib
+import zipfile
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import shared_memory
+from scipy.sparse import csr_matrix
+from scipy.spatial import Delaunay, cKDTree
+
+# 子进程中的共享数据：权重和共享内存中的输入输出数组
+_worker_state = {}
+
+
+class InterpWeights(object):
+    """
+    功能：保存从源网格到目标点的插值权重，每个目标点由k个源点加权得到
+    源网格和目标点不变时，权重只需要计算一次，之后每个时刻的插值都是一次稀疏矩阵乘法
+    """
+
+    def __init__(self, indices, weights, n_source, method='linear'):
+        """
+        参数
+        :param indices: 每个目标点所用的源点下标，shape（n，k）
+        :param weights: 对应的权重，shape（n，k），目标点不在源网格范围内时为nan
+        :param n_source: 源点个数
+        :param method: 插值方法名称
+        """
+        self.indices = np.asarray(indices, dtype=int)
+        self.weights = np.asarray(weights, dtype=float)
+        self.n_source = int(n_source)
+        self.method = method
+        self.valid = ~np.isnan(self.weights).any(axis=1)
+        n_target, k = self.indices.shape
+        self.matrix = csr_matrix((np.where(self.valid[:, None], self.weights, 0).ravel(),
+                                  self.indices.ravel(),
+                                  np.arange(0, n_target * k + 1, k)),
+                                 shape=(n_target, self.n_source))
+
+    def __len__(self):
+        return len(self.indices)
+
+    def __call__(self, values):
+        """
+        功能：对源数据插值
+        :param values: 源数据，最后几维是源网格，例如（time，lat，lon）或者（time，n_source）
+        :return: 插值结果，shape为（time，n_target），不在源网格范围内的点为nan
+        """
+        values = np.asarray(values, dtype=float)
+        lead_shape = values.shape[:-1] if values.shape[-1] == self.n_source \
+            else values.shape[:-2]
+        flat = values.reshape(-1, self.n_source)
+        result = np.asarray(self.matrix @ flat.T).T
+        result[:, ~self.valid] = np.nan
+        return result.reshape(lead_shape + (len(self),))
+
+
+class WeightStore(object):
+    """
+    功能：把插值权重保存在目录中（类似ESMF的权重文件），不同脚本、不同次运行之间共用
+    文件名由插值方法和weights_key组成，源网格或目标点改变时键也会改变
+    """
+
+    def __init__(self, directory):
+        """
+        参数
+        :param directory: 保存权重文件的目录，不存在时自动创建
+        """
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key, method):
+        return os.path.join(self.directory, '{}_{}.npz'.format(method, key))
+
+    def load(self, key, method):
+        """
+        功能：读取权重，不存在时返回None
+        :param key: weights_key计算的键
+        :param method: 插值方法名称
+        :return: InterpWeights或者None
+        """
+        path = self.path(key, method)
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path) as weight_file:
+                return InterpWeights(weight_file['indices'], weight_file['weights'],
+                                     int(weight_file['n_source']), method=method)
+        except (OSError, ValueError, KeyError, zipfile.BadZipFile):
+            return None
+
+    def save(self, key, weights):
+        """
+        功能：保存权重（先写临时文件再替换）
+        :param key: weights_key计算的键
+        :param weights: InterpWeights
+        """
+        path = self.path(key, weights.method)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, indices=weights.indices, weights=weights.weights,
+                     n_source=weights.n_source)
+        os.replace(tmp_path, path)
+
+
+def weights_key(method, *arrays):
+    """
+    功能：由插值方法和源网格、目标点的坐标计算一个键，用于缓存权重
+    :param method: 插值方法名称
+    :param arrays: 坐标数组
+    :return: sha1字符串
+    """
+    sha1 = hashlib.sha1(method.encode())
+    for array in arrays:
+        array = np.ascontiguousarray(array, dtype=float)
+        sha1.update(str(array.shape).encode())
+        sha1.update(array.tobytes())
+    return sha1.hexdigest()
+
+
+def delaunay_weights(src_lon, src_lat, dst_lon, dst_lat):
+    """
+    功能：对散点做Delaunay三角化，计算目标点的重心坐标权重，结果与griddata(method='linear')一致
+    :param src_lon: 源点经度，一维
+    :param src_lat: 源点纬度，一维
+    :param dst_lon: 目标点经度
+    :param dst_lat: 目标点纬度
+    :return: InterpWeights
+    """
+    src = np.column_stack([np.ravel(src_lon), np.ravel(src_lat)]).astype(float)
+    dst = np.column_stack([np.ravel(dst_lon), np.ravel(dst_lat)]).astype(float)
+    tri = Delaunay(src)
+    simplex = tri.find_simplex(dst)
+    inside = simplex >= 0
+    transform = tri.transform[simplex]
+    bary = np.einsum('ijk,ik->ij', transform[:, :2, :], dst - transform[:, 2, :])
+    weights = np.column_stack([bary, 1 - bary.sum(axis=1)])
+    weights[~inside] = np.nan
+    indices = np.where(inside[:, None], tri.simplices[simplex], 0)
+    return InterpWeights(indices, weights, len(src), method='linear')
+
+
+def nearest_weights(src_lon, src_lat, dst_lon, dst_lat):
+    """
+    功能：最近点插值的权重，与griddata(method='nearest')一致（经纬度平面上的欧氏距离）
+    :param src_lon: 源点经度，一维
+    :param src_lat: 源点纬度，一维
+    :param dst_lon: 目标点经度
+    :param dst_lat: 目标点纬度
+    :return: InterpWeights，每个目标点1个源点
+    """
+    src = np.column_stack([np.ravel(src_lon), np.ravel(src_lat)]).astype(float)
+    dst = np.column_stack([np.ravel(dst_lon), np.ravel(dst_lat)]).astype(float)
+    _, index = cKDTree(src).query(dst)
+    return InterpWeights(index[:, None], np.ones([len(dst), 1]), len(src),
+                         method='nearest')
+
+
+def interp_in_time(src_time, values, dst_time, per_point=False):
+    """
+    功能：沿时间维度线性插值，所有点一起计算（代替每个点一个interp1d）
+    :param src_time: 源数据的时间，一维，升序
+    :param values: 源数据，shape（time，n）
+    :param dst_time: 需要插值的时间。per_point=False时是所有点共用的时间序列；
+                     per_point=True时每个点一个时间，shape（n，）
+    :param per_point: 每个点是否只插值到自己的时间
+    :return: per_point=False时shape（len(dst_time)，n），per_point=True时shape（n，）
+    """
+    src_time = np.asarray(src_time, dtype=float)
+    dst_time = np.asarray(dst_time, dtype=float)
+    values = np.asarray(values)
+    if np.any(dst_time < src_time[0]) or np.any(dst_time > src_time[-1]):
+        raise ValueError('插值时间超出源数据的时间范围')
+    index = np.clip(np.searchsorted(src_time, dst_time, side='right') - 1,
+                    0, len(src_time) - 2)
+    frac = (dst_time - src_time[index]) / (src_time[index + 1] - src_time[index])
+    if per_point:
+        column = np.arange(values.shape[1])
+        return values[index, column] * (1 - frac) + values[index + 1, column] * frac
+    return values[index] * (1 - frac)[:, None] + values[index + 1] * frac[:, None]
+
+
+def _axis_weights(axis, points):
+    """
+    功能：用searchsorted找出点在一维坐标轴上左右两个格点的下标和比例，支持降序的坐标轴（例如ERA5的纬度）
+    :param axis: 一维坐标轴，单调
+    :param points: 需要插值的点
+    :return: lower, upper: 左右两个格点在原坐标轴中的下标
+    :return: frac: 点到lower的距离占格距的比例
+    :return: valid: 点是否在坐标轴范围内
+    """
+    axis = np.asarray(axis, dtype=float)
+    points = np.asarray(points, dtype=float).ravel()
+    n = len(axis)
+    descending = axis[0] > axis[-1]
+    ascending_axis = axis[::-1] if descending else axis
+    index = np.clip(np.searchsorted(ascending_axis, points, side='right') - 1,
+                    0, n - 2)
+    frac = (points - ascending_axis[index]) / \
+           (ascending_axis[index + 1] - ascending_axis[index])
+    valid = (points >= ascending_axis[0]) & (points <= ascending_axis[-1])
+    if descending:
+        return n - 1 - index, n - 2 - index, frac, valid
+    return index, index + 1, frac, valid
+
+
+def bilinear_weights(src_lon, src_lat, dst_lon, dst_lat):
+    """
+    功能：规则经纬度网格到任意点的双线性插值权重，源数据按（lat，lon）排列
+    :param src_lon: 源网格的经度轴，一维
+    :param src_lat: 源网格的纬度轴，一维，可以是降序
+    :param dst_lon: 目标点经度（网格点lon/lat或者网格中心lonc/latc）
+    :param dst_lat: 目标点纬度
+    :return: InterpWeights，每个目标点4个角点
+    """
+    nlon = len(src_lon)
+    i0, i1, fx, valid_x = _axis_weights(src_lon, dst_lon)
+    j0, j1, fy, valid_y = _axis_weights(src_lat, dst_lat)
+    indices = np.column_stack([j0 * nlon + i0, j0 * nlon + i1,
+                               j1 * nlon + i0, j1 * nlon + i1])
+    weights = np.column_stack([(1 - fy) * (1 - fx), (1 - fy) * fx,
+                               fy * (1 - fx), fy * fx])
+    weights[~(valid_x & valid_y)] = np.nan
+    return InterpWeights(indices, weights, nlon * len(src_lat),
+                         method='bilinear')
+
+
+def _init_worker(weights, in_name, in_shape, out_name, out_shape):
+    """
+    功能：子进程初始化，权重只在每个子进程启动时传一次，输入输出数组通过共享内存访问
+    """
+    in_shm = shared_memory.SharedMemory(name=in_name)
+    out_shm = shared_memory.SharedMemory(name=out_name)
+    _worker_state['weights'] = weights
+    _worker_state['shm'] = (in_shm, out_shm)
+    _worker_state['values'] = np.ndarray(in_shape, dtype=float, buffer=in_shm.buf)
+    _worker_state['result'] = np.ndarray(out_shape, dtype=float, buffer=out_shm.buf)
+
+
+def _interp_time_slice(start, stop):
+    """
+    功能：子进程中插值一段时间，结果直接写入共享内存
+    """
+    weights = _worker_state['weights']
+    _worker_state['result'][start:stop] = weights(_worker_state['values'][start:stop])
+    return start
+
+
+def apply_weights_parallel(weights, values, workers=None, executor='process',
+                           chunk_size=None):
+    """
+    功能：把时间维度分成若干段，并行插值
+    executor='process'时输入输出放在共享内存中，权重在子进程启动时传一次，每个任务只传时间段的下标；
+    executor='thread'时直接共享数组（稀疏矩阵乘法大部分时间在C代码中）
+    注意：Windows下使用'process'时，调用的脚本需要放在 if __name__ == '__main__': 中
+    :param weights: InterpWeights
+    :param values: 源数据，第一维为时间，例如（time，lat，lon）
+    :param workers: 进程（线程）数，None表示cpu个数
+    :param executor: 'process'或者'thread'
+    :param chunk_size: 每个任务的时间步数，None表示平均分给每个worker
+    :return: 插值结果，shape（time，n_target）
+    """
+    time_length = len(values)
+    values = np.ascontiguousarray(np.reshape(values, (time_length, weights.n_source)),
+                                  dtype=float)
+    out_shape = (time_length, len(weights))
+    if chunk_size is None:
+        n_workers = workers or os.cpu_count() or 1
+        chunk_size = max(1, -(-time_length // (n_workers * 4)))
+    slices = [(start, min(start + chunk_size, time_length))
+              for start in range(0, time_length, chunk_size)]
+    if executor == 'thread':
+        result = np.empty(out_shape)
+
+        def interp_slice(start, stop):
+            result[start:stop] = weights(values[start:stop])
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for job in [pool.submit(interp_slice, *x) for x in slices]:
+                job.result()
+        return result
+    if executor != 'process':
+        raise ValueError('不支持的executor：{}'.format(executor))
+    in_shm = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+    out_shm = shared_memory.SharedMemory(create=True,
+                                         size=max(8 * out_shape[0] * out_shape[1], 1))
+    try:
+        np.ndarray(values.shape, dtype=float, buffer=in_shm.buf)[:] = values
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(weights, in_shm.name, values.shape,
+                                           out_shm.name, out_shape)) as pool:
+            for job in [pool.submit(_interp_time_slice, *x) for x in slices]:
+                job.result()
+        result = np.ndarray(out_shape, dtype=float, buffer=out_shm.buf).copy()
+    finally:
+        in_shm.close()
+        in_shm.unlink()
+        out_shm.close()
+        out_shm.unlink()
+    return result
@@ -5,6 +5,8 @@
 # __TIME__   = 2019/6/3 22:06
 
 import os
+import glob
+from collections import OrderedDict
 from netCDF4 import Dataset, MFDataset, num2date
 import pandas as pd
 import numpy as np
@@ -21,12 +23,13 @@ class ReadData(Grid):
     1. read_tp_track —— 读取JTWC发布的台风最佳路径
     2. read_ch_track —— 读取中国气象局发布的台风最佳路径
     3. read_ecmwf_data —— 读取ecmwf数据
-    4. read_fvcom_nc —— 读取包含网格数据的fvcom nc文件
+    4. read_fvcom_nc —— 读取包含网格数据的fvcom nc文件（可以是多个编号的输出文件）
     5. read_obc_nc —— 读取边界点的nc文件
     """
 
     def __init__(self, data_path, types=None, str_before=None, str_after=None,
-                 variables=None, extents=[0, 360, -90, 90], alti_cycle=None):
+                 variables=None, extents=[0, 360, -90, 90], alti_cycle=None,
+                 lazy=False, max_open_files=4):
         """
         参数
         :param data_path:需要去数据的路径, 可以是str，也可以是list（读取nc的时候）
@@ -36,6 +39,9 @@ class ReadData(Grid):
         :param str_before: 从多个台风路径中分离出我们所需要的台风，这个是上标，用于read_ch_track
         :param str_after: 从多个台风路径中分离出我们所需要的台风，这个是下标，用于read_ch_track
         :param alti_cycle: 选取高度计的cycle，用于read_alti_data
+        :param lazy: True表示read_fvcom_nc不读取整个变量，self.data中的变量为NcVariable，
+                     切片时只读取对应的部分，文件在close()（或者with语句结束）时关闭
+        :param max_open_files: read_fvcom_nc读取多个文件时，同时保持打开的文件个数（最近使用的）
 
         返回
         ：:return self.data
@@ -48,6 +54,9 @@ class ReadData(Grid):
         self.type = types
         self.extents = extents
         self.alti_cycle = alti_cycle
+        self.lazy = lazy
+        self.max_open_files = max_open_files
+        self._nc_file = None
         # 分割出文件名
         if isinstance(self.data_path, str):
             self.filename = self.data_path.split('\\')[-1]
@@ -194,11 +203,10 @@ class ReadData(Grid):
                   lon_left_index:lon_right_index + 1]
             setattr(self.data, 'slp', slp)
 
-    def read_ecmwf_data(self):
+    def _open_ecmwf_data(self):
         """
-        功能：读取ecmwf数据
-        返回
-        :return: self.data
+        功能：打开ecmwf文件，计算经纬度范围的下标和去重后的时间下标
+        :return: nc_file, lat_slice, lon_slice, lon, lat, time, time_index
         """
         if isinstance(self.data_path, str):
             print("读取ECMWF文件：{}".format(self.filename))
@@ -210,7 +218,6 @@ class ReadData(Grid):
         else:
             raise ValueError("不支持输入的格式")
 
-        # 读取各种变量，并存储
         # 选取范围
         lon_temp = nc_file.variables['longitude'][:]
         lat_temp = nc_file.variables['latitude'][:]
@@ -218,69 +225,116 @@ class ReadData(Grid):
         lat_right_index = np.where(lat_temp >= self.extents[2])[0][-1]
         lon_left_index = np.where(lon_temp >= self.extents[0])[0][0]
         lon_right_index = np.where(lon_temp <= self.extents[1])[0][-1]
-        lat = lat_temp[lat_left_index:lat_right_index + 1]
-        lon = lon_temp[lon_left_index:lon_right_index + 1]
+        lat_slice = slice(lat_left_index, lat_right_index + 1)
+        lon_slice = slice(lon_left_index, lon_right_index + 1)
+        time_temp = nc_file.variables['time'][:]
+        time_date = num2date(time_temp, nc_file.variables['time'].units)
+        time = pltdate.date2num(time_date)
+        # 多文件拼接时可能有重复的时间
+        time, time_index = np.unique(time, return_index=True)
+        return (nc_file, lat_slice, lon_slice, lon_temp[lon_slice],
+                lat_temp[lat_slice], time, time_index)
+
+    def _read_ecmwf_variables(self, nc_file, time_index, lat_slice, lon_slice,
+                              store):
+        """
+        功能：读取指定时间下标的ecmwf变量，存到store中
+        """
+        if 'wind' in self.variables:
+            u10 = nc_file.variables['u10'][time_index, lat_slice, lon_slice]
+            setattr(store, 'u10', u10)
+            v10 = nc_file.variables['v10'][time_index, lat_slice, lon_slice]
+            setattr(store, 'v10', v10)
+        if 'sst' in self.variables:
+            sst = nc_file.variables['sst'][time_index, lat_slice, lon_slice]
+            setattr(store, 'sst', sst - 273.15)
+        if 't2m' in self.variables:
+            t2m = nc_file.variables['t2m'][time_index, lat_slice, lon_slice]
+            setattr(store, 't2m', t2m - 273.15)
+        if 'slp' in self.variables:
+            slp = nc_file.variables['sp'][time_index, lat_slice, lon_slice]
+            setattr(store, 'slp', slp)
+
+    def read_ecmwf_data(self):
+        """
+        功能：读取ecmwf数据
+        返回
+        :return: self.data
+        """
+        nc_file, lat_slice, lon_slice, lon, lat, time, time_index = \
+            self._open_ecmwf_data()
         if 'lon' in self.variables:
             setattr(self.data, 'lon', lon)
         if 'lat' in self.variables:
             setattr(self.data, 'lat', lat)
         if 'time' in self.variables:
-            time_temp = nc_file.variables['time'][:]
-            time_date = num2date(time_temp, nc_file.variables['time'].units)
-            time = pltdate.date2num(time_date)
-            x, y = np.unique(time, return_index=True)
-            setattr(self.data, 'time', x)
-        if 'wind' in self.variables:
-            u10 = nc_file.variables['u10'][y, lat_left_index:lat_right_index + 1,
-                  lon_left_index:lon_right_index + 1]
-            setattr(self.data, 'u10', u10)
-            v10 = nc_file.variables['v10'][y, lat_left_index:lat_right_index + 1,
-                  lon_left_index:lon_right_index + 1]
-            setattr(self.data, 'v10', v10)
-        if 'sst' in self.variables:
-            sst = nc_file.variables['sst'][y, lat_left_index:lat_right_index + 1,
-                  lon_left_index:lon_right_index + 1]
-            setattr(self.data, 'sst', sst - 273.15)
-        if 't2m' in self.variables:
-            t2m = nc_file.variables['t2m'][y, lat_left_index:lat_right_index + 1,
-                  lon_left_index:lon_right_index + 1]
-            setattr(self.data, 't2m', t2m - 273.15)
-        if 'slp' in self.variables:
-            slp = nc_file.variables['sp'][y, lat_left_index:lat_right_index + 1,
-                  lon_left_index:lon_right_index + 1]
-            setattr(self.data, 'slp', slp)
+            setattr(self.data, 'time', time)
+        self._read_ecmwf_variables(nc_file, time_index, lat_slice, lon_slice,
+                                   self.data)
+
+    def iter_ecmwf_data(self, chunk_size=24):
+        """
+        功能：按时间窗口逐块读取ecmwf数据，内存只与chunk_size有关
+        使用时不要设置types（避免构造时整体读取），例如：
+        ReadData(paths, variables=['wind', 'slp'], extents=[...]).iter_ecmwf_data(24)
+        :param chunk_size: 每块的时间步数
+        :return: 生成器，每次返回一个PassiveStore，包括lon，lat，time和所选变量
+        """
+        nc_file, lat_slice, lon_slice, lon, lat, time, time_index = \
+            self._open_ecmwf_data()
+        try:
+            for start in range(0, len(time), chunk_size):
+                chunk = PassiveStore()
+                setattr(chunk, 'lon', lon)
+                setattr(chunk, 'lat', lat)
+                setattr(chunk, 'time', time[start:start + chunk_size])
+                self._read_ecmwf_variables(nc_file,
+                                           time_index[start:start + chunk_size],
+                                           lat_slice, lon_slice, chunk)
+                yield chunk
+        finally:
+            nc_file.close()
 
     def read_fvcom_nc(self, mode='r', *args, **kwargs):
         """
         功能：读取fvcom的nc文件
+        data_path可以是通配符（例如r'E:\fvcom\windNCEP_*.nc'）或者list，多个输出文件按时间拼接成一个，
+        只读取每个文件的时间建立索引，切片时只打开时间上重叠的文件（NcFileSet）
+        lazy=True时，uwnd，vwnd，slp，zeta，h为NcVariable（多文件时为MultiFileVariable），
+        例如data.zeta[:, index]只读取一列
         :return:
         """
-        print("读取fvcom的nc文件：{}".format(self.filename))
-        nc_file = Dataset(self.data_path, mode, *args, **kwargs)
-        lon = nc_file.variables['lon'][:]
-        lat = nc_file.variables['lat'][:]
-        lonc = nc_file.variables['lonc'][:]
-        latc = nc_file.variables['latc'][:]
-        nv = nc_file.variables['nv'][:]
-        time = nc_file.variables['Times'][:]
-        try:
-            date = [datetime.strptime(''.join(t.astype(str)), '%Y-%m-%dT%H:%M:%S.%f') for t in time]
-        except:
-            date = [datetime.strptime(''.join(t.astype(str)), '%Y/%m/%d %H:%M:%S      ') for t in time]
-        time_final = pltdate.date2num(date)
+        files = _fvcom_files(self.data_path)
+        self.close()
+        if len(files) == 1:
+            print("读取fvcom的nc文件：{}".format(os.path.basename(files[0])))
+            nc_file = Dataset(files[0], mode, *args, **kwargs)
+            grid_file = nc_file
+            time_final = _fvcom_time(nc_file)
+        else:
+            print("读取fvcom的nc文件：{}".format([os.path.basename(x) for x in files]))
+            nc_file = NcFileSet(files, self.max_open_files, mode, *args, **kwargs)
+            grid_file = nc_file.dataset(0)
+            time_final = nc_file.time
+        self._nc_file = nc_file
+        lon = grid_file.variables['lon'][:]
+        lat = grid_file.variables['lat'][:]
+        lonc = grid_file.variables['lonc'][:]
+        latc = grid_file.variables['latc'][:]
+        nv = grid_file.variables['nv'][:]
         if 'wind' in self.variables:
-            u10 = nc_file.variables['uwind_speed'][:]
-            v10 = nc_file.variables['vwind_speed'][:]
+            u10 = self._fvcom_variable('uwind_speed')
+            v10 = self._fvcom_variable('vwind_speed')
             setattr(self.data, 'uwnd', u10)
             setattr(self.data, 'vwnd', v10)
         if 'slp' in self.variables:
-            slp = nc_file.variables['air_pressure'][:]
+            slp = self._fvcom_variable('air_pressure')
             setattr(self.data, 'slp', slp)
         if 'zeta' in self.variables:
-            zeta = nc_file.variables['zeta'][:]
+            zeta = self._fvcom_variable('zeta')
             setattr(self.data, 'zeta', zeta)
         if 'h' in self.variables:
-            h = nc_file.variables['h'][:]
+            h = self._fvcom_variable('h')
             setattr(self.data, 'h', h)
         setattr(self, 'lon', lon)
         setattr(self, 'lat', lat)
@@ -288,6 +342,81 @@ class ReadData(Grid):
         setattr(self, 'latc', latc)
         setattr(self, 'nv', nv)
         setattr(self.data, 'time', time_final)
+        if not self.lazy:
+            self.close()
+
+    def extract_stations(self, stations, start=None, end=None, variables=None,
+                         names=None, max_gap=64):
+        """
+        功能：一次提取多个站点的时间序列（zeta，slp在网格点上，uwnd，vwnd在网格中心上），
+             站点通过空间索引找到最近的网格点（网格中心），每个变量只读取需要的列，
+             下标排序后把相近的列合并成连续的块读取（lazy=True时效果最明显）
+        :param stations: 站点经纬度的list，例如[(121.169, 28.053), (118.04, 24.27)]
+        :param start: 开始时间，datetime或者matplotlib的时间数字，None表示从头开始
+        :param end: 结束时间（包括在内），None表示到最后
+        :param variables: 需要提取的变量，例如['zeta', 'uwnd', 'vwnd', 'slp', 'h']，None表示所有已读取的变量
+        :param names: 站点名称，None表示用序号
+        :param max_gap: 两列的下标相差不超过max_gap时合并成一次读取
+        :return: DataFrame，每行一个站点的一个时刻，包括station，time，lon，lat，node，nele和各个变量
+        """
+        if variables is None:
+            variables = [name for name in ['zeta', 'slp', 'uwnd', 'vwnd', 'h']
+                         if name in self.data]
+        names = list(range(len(stations))) if names is None else list(names)
+        lons, lats = np.asarray(stations, dtype=float).reshape(-1, 2).T
+        time = np.asarray(self.data.time)
+        first = 0 if start is None else \
+            np.searchsorted(time, _to_datenum(start), side='left')
+        last = len(time) if end is None else \
+            np.searchsorted(time, _to_datenum(end), side='right')
+        time_slice = slice(first, last)
+        station_time = time[time_slice]
+        table = {'station': np.repeat(names, len(station_time)),
+                 'time': np.tile(pd.to_datetime(pltdate.num2date(station_time)).tz_localize(None),
+                                 len(names)),
+                 'lon': np.repeat(lons, len(station_time)),
+                 'lat': np.repeat(lats, len(station_time))}
+        index = {}
+        if set(variables) & {'zeta', 'slp', 'h'}:
+            index['node'] = self.find_nearest_points(lons, lats)
+            table['node'] = np.repeat(index['node'], len(station_time))
+        if set(variables) & {'uwnd', 'vwnd'}:
+            index['nele'] = self.find_nearest_points(lons, lats, var='u')
+            table['nele'] = np.repeat(index['nele'], len(station_time))
+        for name in variables:
+            columns = index['nele'] if name in ['uwnd', 'vwnd'] else index['node']
+            values = read_columns(getattr(self.data, name), time_slice, columns,
+                                  max_gap=max_gap)
+            # 没有时间维的变量（h）每个时刻重复
+            table[name] = np.repeat(values, len(station_time)) if values.ndim == 1 \
+                else values.T.ravel()
+        return pd.DataFrame(table)
+
+    def _fvcom_variable(self, name):
+        """
+        功能：lazy=True时返回NcVariable（多文件时为MultiFileVariable），否则读取整个变量
+        """
+        if isinstance(self._nc_file, NcFileSet):
+            variable = self._nc_file.variable(name)
+            return variable if self.lazy else variable[:]
+        variable = self._nc_file.variables[name]
+        if self.lazy:
+            return NcVariable(variable)
+        return variable[:]
+
+    def close(self):
+        """
+        功能：关闭lazy=True时保持打开的nc文件，之后不能再对NcVariable切片
+        """
+        if getattr(self, '_nc_file', None) is not None:
+            self._nc_file.close()
+            self._nc_file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
 
     def read_obc_nc(self, *args, **kwargs):
         """
@@ -298,10 +427,7 @@ class ReadData(Grid):
         """
         print("读取边界点的nc文件：{}".format(self.filename))
         nc_file = Dataset(self.data_path, *args, **kwargs)
-        time = nc_file.variables['Times'][:]
-        date = [datetime.strptime(''.join(t.astype(str)), '%Y-%m-%dT%H:%M:%S.%f') for t in time]
-        time_final = pltdate.date2num(date)
-        setattr(self.data, 'time', time_final)
+        setattr(self.data, 'time', self._read_obc_time(nc_file, slice(None)))
         if 'obc' in self.variables:
             obc = nc_file.variables['obc_nodes'][:]
             setattr(self.data, 'obc', obc)
@@ -309,6 +435,40 @@ class ReadData(Grid):
             elev = nc_file.variables['elevation'][:]
             setattr(self.data, 'elev', elev)
 
+    @staticmethod
+    def _read_obc_time(nc_file, time_slice):
+        """
+        功能：读取obc文件中一段时间的Times，转为matplotlib的时间数字
+        """
+        time = nc_file.variables['Times'][time_slice]
+        date = [datetime.strptime(''.join(t.astype(str)), '%Y-%m-%dT%H:%M:%S.%f') for t in time]
+        return pltdate.date2num(date)
+
+    def iter_obc_nc(self, chunk_size=720):
+        """
+        功能：按时间窗口逐块读取obc的nc文件，内存只与chunk_size有关
+        使用时不要设置types（避免构造时整体读取），例如：
+        ReadData(obc_path, variables=['obc', 'elev']).iter_obc_nc(720)
+        :param chunk_size: 每块的时间步数
+        :return: 生成器，每次返回一个PassiveStore，包括time和所选变量（obc每块都相同）
+        """
+        nc_file = Dataset(self.data_path)
+        try:
+            obc = nc_file.variables['obc_nodes'][:]
+            time_length = len(nc_file.dimensions['time'])
+            for start in range(0, time_length, chunk_size):
+                time_slice = slice(start, start + chunk_size)
+                chunk = PassiveStore()
+                setattr(chunk, 'time', self._read_obc_time(nc_file, time_slice))
+                if 'obc' in self.variables:
+                    setattr(chunk, 'obc', obc)
+                if 'elev' in self.variables:
+                    setattr(chunk, 'elev',
+                            nc_file.variables['elevation'][time_slice])
+                yield chunk
+        finally:
+            nc_file.close()
+
     def read_alti_data(self, *args, **kwargs):
         """
         功能：读取高度计数据
@@ -387,3 +547,250 @@ class ReadData(Grid):
             setattr(self.data, 'min_pressure', min_pressure)
         setattr(self.data, 'station', station)
         setattr(self.data, 'time', time_stamp)
+
+
+def _fvcom_files(data_path):
+    """
+    功能：fvcom输出文件的路径，data_path可以是单个文件、通配符或者list
+    :return: 文件路径的list
+    """
+    if isinstance(data_path, str):
+        if not glob.has_magic(data_path):
+            return [data_path]
+        files = sorted(glob.glob(data_path))
+    else:
+        files = list(data_path)
+    if not files:
+        raise ValueError("没有找到fvcom的nc文件：{}".format(data_path))
+    return files
+
+
+def _fvcom_time(nc_file):
+    """
+    功能：读取fvcom nc文件的Times，转为matplotlib的时间数字
+    """
+    time = nc_file.variables['Times'][:]
+    try:
+        date = [datetime.strptime(''.join(t.astype(str)), '%Y-%m-%dT%H:%M:%S.%f') for t in time]
+    except:
+        date = [datetime.strptime(''.join(t.astype(str)), '%Y/%m/%d %H:%M:%S      ') for t in time]
+    return pltdate.date2num(date)
+
+
+def _to_datenum(time):
+    """
+    功能：datetime（或时间字符串）转为matplotlib的时间数字，数字直接返回
+    """
+    if isinstance(time, (int, float, np.number)):
+        return time
+    return pltdate.date2num(pd.Timestamp(time).to_pydatetime())
+
+
+def read_columns(variable, time_slice, indices, max_gap=64):
+    """
+    功能：读取（time，n）变量中的若干列，下标排序去重后，相差不超过max_gap的列合并成一个连续块读取，
+         没有时间维的变量（n，）（例如h）直接读取对应的元素
+    :param variable: 变量，可以是NcVariable，netCDF4.Variable或者数组
+    :param time_slice: 时间方向的slice，变量没有时间维时不使用
+    :param indices: 需要的列的下标
+    :param max_gap: 两列的下标相差不超过max_gap时合并成一次读取
+    :return: shape（time，len(indices)），没有时间维时为（len(indices)，），列的顺序与indices一致
+    """
+    indices = np.asarray(indices, dtype=int).ravel()
+    order = np.unique(indices)
+    breaks = np.nonzero(np.diff(order) > max_gap)[0] + 1
+    blocks = []
+    for run in np.split(order, breaks):
+        columns = slice(run[0], run[-1] + 1)
+        block = variable[columns] if variable.ndim == 1 else variable[time_slice, columns]
+        block = np.ma.filled(np.ma.asarray(block, dtype=float), np.nan)
+        blocks.append(block[..., run - run[0]])
+    values = np.concatenate(blocks, axis=-1)
+    return values[..., np.searchsorted(order, indices)]
+
+
+class NcVariable(object):
+    """
+    功能：nc文件中变量的代理，切片时才从文件中读取对应的部分（hyperslab），用于ReadData(lazy=True)
+    """
+
+    def __init__(self, variable):
+        """
+        参数
+        :param variable: netCDF4.Variable
+        """
+        self.variable = variable
+
+    @property
+    def shape(self):
+        return self.variable.shape
+
+    @property
+    def ndim(self):
+        return self.variable.ndim
+
+    @property
+    def dtype(self):
+        return self.variable.dtype
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, key):
+        return self.variable[key]
+
+    def __array__(self, dtype=None, copy=None):
+        values = np.asarray(self.variable[:])
+        return values if dtype is None else values.astype(dtype)
+
+
+class NcFileSet(object):
+    """
+    功能：把按编号分开输出的fvcom文件（_0001，_0002，...）按时间拼接成一个，用于ReadData(types='fvcom')
+    构造时只读取每个文件的时间建立索引（读完即关闭），读取变量时只打开时间上重叠的文件，
+    最近使用的max_open个文件保持打开（LRU），其余的关闭
+    """
+
+    def __init__(self, files, max_open=4, mode='r', *args, **kwargs):
+        """
+        参数
+        :param files: 文件路径的list
+        :param max_open: 同时保持打开的文件个数
+        :param mode, args, kwargs: 打开文件的参数，参考netCDF4.Dataset
+        """
+        self.max_open = max(int(max_open), 1)
+        self._open_args = (mode,) + args
+        self._open_kwargs = kwargs
+        self._handles = OrderedDict()
+        times = []
+        for path in files:
+            with Dataset(path, *self._open_args, **self._open_kwargs) as nc_file:
+                times.append(_fvcom_time(nc_file))
+        # 按每个文件的开始时间排序，重启输出时与上一个文件重复的时刻只保留一次
+        order = sorted(range(len(files)),
+                       key=lambda i: times[i][0] if len(times[i]) else np.inf)
+        self.files, self.starts, time = [], [], []
+        last = -np.inf
+        for i in order:
+            skip = int(np.searchsorted(times[i], last, side='right'))
+            if skip == len(times[i]):
+                continue
+            self.files.append(files[i])
+            self.starts.append(skip)
+            time.append(times[i][skip:])
+            last = times[i][-1]
+        self.offsets = np.cumsum([0] + [len(x) for x in time])
+        self.time = np.concatenate(time)
+
+    def dataset(self, index):
+        """
+        功能：第index个文件的Dataset，没有打开时打开，超过max_open时关闭最久没有使用的文件
+        """
+        path = self.files[index]
+        if path in self._handles:
+            self._handles.move_to_end(path)
+        else:
+            self._handles[path] = Dataset(path, *self._open_args, **self._open_kwargs)
+            while len(self._handles) > self.max_open:
+                self._handles.popitem(last=False)[1].close()
+        return self._handles[path]
+
+    def variable(self, name):
+        """
+        功能：变量的代理，切片时只读取对应的文件
+        """
+        return MultiFileVariable(self, name)
+
+    def locate(self, time_index):
+        """
+        功能：把拼接后的时间下标转为（文件序号，文件中的时间下标）
+        """
+        time_index = np.asarray(time_index, dtype=int)
+        file_index = np.searchsorted(self.offsets, time_index, side='right') - 1
+        return file_index, time_index - self.offsets[file_index] + \
+            np.asarray(self.starts, dtype=int)[file_index]
+
+    def close(self):
+        """
+        功能：关闭所有打开的文件
+        """
+        while self._handles:
+            self._handles.popitem()[1].close()
+
+
+class MultiFileVariable(object):
+    """
+    功能：NcFileSet中变量的代理，用法与NcVariable相同，时间维的切片按文件分开读取后拼接，
+         没有时间维的变量（例如h）从第一个文件读取
+    """
+
+    def __init__(self, file_set, name):
+        """
+        参数
+        :param file_set: NcFileSet
+        :param name: 变量名称
+        """
+        self.file_set = file_set
+        self.name = name
+        variable = file_set.dataset(0).variables[name]
+        self.time_dependent = len(variable.dimensions) > 0 and \
+            variable.dimensions[0] == 'time'
+        if self.time_dependent:
+            self._shape = (len(file_set.time),) + variable.shape[1:]
+        else:
+            self._shape = variable.shape
+        self._dtype = variable.dtype
+
+    @property
+    def shape(self):
+        return self._shape
+
+    @property
+    def ndim(self):
+        return len(self._shape)
+
+    @property
+    def dtype(self):
+        return self._dtype
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, key):
+        if not self.time_dependent:
+            return self.file_set.dataset(0).variables[self.name][key]
+        key = key if isinstance(key, tuple) else (key,)
+        if key and key[0] is not Ellipsis:
+            time_key, rest = key[0], key[1:]
+        else:
+            time_key, rest = slice(None), key
+        time_index = np.arange(self.shape[0])[time_key]
+        scalar = np.ndim(time_index) == 0
+        time_index = np.atleast_1d(time_index)
+        if len(time_index) == 0:
+            return self.file_set.dataset(0).variables[self.name][(slice(0, 0),) + rest]
+        file_index, local_index = self.file_set.locate(time_index)
+        # 相邻且属于同一个文件的时刻一次读取
+        breaks = np.nonzero(np.diff(file_index))[0] + 1
+        blocks = []
+        for files, local in zip(np.split(file_index, breaks), np.split(local_index, breaks)):
+            variable = self.file_set.dataset(files[0]).variables[self.name]
+            blocks.append(self._read(variable, local, rest))
+        values = blocks[0] if len(blocks) == 1 else np.ma.concatenate(blocks, axis=0)
+        return values[0] if scalar else values
+
+    @staticmethod
+    def _read(variable, local, rest):
+        """
+        功能：读取一个文件中的若干时刻，等间隔递增的时刻直接用slice读取，否则读取覆盖的范围后再选取
+        """
+        step = np.diff(local)
+        if len(local) == 1 or (step[0] > 0 and np.all(step == step[0])):
+            step = 1 if len(local) == 1 else int(step[0])
+            return variable[(slice(local[0], local[-1] + 1, step),) + rest]
+        lo, hi = local.min(), local.max()
+        return variable[(slice(lo, hi + 1),) + rest][local - lo]
+
+    def __array__(self, dtype=None, copy=None):
+        values = np.asarray(self[:])
+        return values if dtype is None else values.astype(dtype)
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+# __NAME__   = reconstructe_calibrate.py
+# __AUTHOR__ = 'QIU ZHOU'
+# __TIME__   = 2019/9/2 10:05
+
+import numpy as np
+from scipy.optimize import minimize
+from .utily import PassiveStore, distance_on_sphere
+from .reconstructe_wind import Reconstructe, TrackReconstructe
+
+
+class ReconstructeCalibration(object):
+    """
+    功能：用多个站点的实测风场率定台风重构的参数（Rk，theta，c1，c2）
+    模型只在站点位置、观测时刻上计算（每个观测一个点），不需要重构整个网格，
+    到台风中心的距离和路径插值只计算一次；c1，c2是线性参数，同一组（Rk，theta）下所有c1，c2一起计算
+    """
+
+    def __init__(self, track, sites, positions, P1=1013.25, Rmax_mold=1,
+                 metric='speed', track_method='linear', time_range=None):
+        """
+        参数
+        :param track: 台风路径数据类，包括tp_time，tp_lon，tp_lat，tp_press，tp_vmax
+        :param sites: 站点数据类的list，每个包括time，wind_spd，wind_dir（例如ReadData(types='site_excel').data）
+        :param positions: 每个站点的经纬度，例如[(122.27, 30.44), (121.57, 29.12)]
+        :param P1: 距离台风中心无限远处的气压，hpa
+        :param Rmax_mold: 计算最大风速半径的方法，参考Reconstructe
+        :param metric: 'speed'只比较风速大小，'vector'比较风矢量（风向为风的来向，单位为度）
+        :param track_method: 路径插值到观测时刻的方法，参考interp_track
+        :param time_range: 参与率定的时间范围（matplotlib的时间数字），例如[start, end]，None表示路径的时间范围
+        """
+        if metric not in ['speed', 'vector']:
+            raise ValueError('不支持的误差类型：{}'.format(metric))
+        self.P1 = P1
+        self.Rmax_mold = Rmax_mold
+        self.metric = metric
+        engine = TrackReconstructe(track, [], [], [], [])
+        start, end = engine.time[0], engine.time[-1]
+        if time_range is not None:
+            start, end = max(start, time_range[0]), min(end, time_range[1])
+        # 所有站点的观测拼成一维，每个观测对应一个站点位置和一个路径时刻
+        lon, lat, time, station, spd, direction = [], [], [], [], [], []
+        for i, (site, position) in enumerate(zip(sites, positions)):
+            site_time = np.asarray(site.time, dtype=float)
+            site_spd = np.asarray(site.wind_spd, dtype=float)
+            site_dir = np.asarray(site.wind_dir, dtype=float)
+            valid = (site_time >= start) & (site_time <= end) & \
+                np.isfinite(site_spd) & np.isfinite(site_dir)
+            lon.append(np.full(valid.sum(), position[0], dtype=float))
+            lat.append(np.full(valid.sum(), position[1], dtype=float))
+            time.append(site_time[valid])
+            station.append(np.full(valid.sum(), i))
+            spd.append(site_spd[valid])
+            direction.append(site_dir[valid])
+        self.lon, self.lat, self.time, self.station, self.wind_spd, self.wind_dir = \
+            map(np.concatenate, [lon, lat, time, station, spd, direction])
+        if len(self.time) == 0:
+            raise ValueError('台风路径时间范围内没有站点观测')
+        # 风向为来向，转为u，v
+        self.obs_u = -self.wind_spd * np.sin(np.deg2rad(self.wind_dir))
+        self.obs_v = -self.wind_spd * np.cos(np.deg2rad(self.wind_dir))
+        self.engine = engine.at_times(self.time, method=track_method)
+        self.r = distance_on_sphere(self.lon, self.lat, self.engine.tp_lon,
+                                    self.engine.tp_lat)
+
+    def components(self, Rk=40, theta=20):
+        """
+        功能：在所有观测上计算移动风场和梯度风（与c1，c2无关）
+        :return: u_mov, v_mov, u_vg, v_vg，shape（观测个数，）
+        """
+        engine = self.engine
+        recon = Reconstructe(self.lon, self.lat, engine.tp_lon, engine.tp_lat,
+                             engine.tp_press, self.P1, engine.tp_vmax,
+                             engine.tp_lon_af, engine.tp_lat_af, engine.dt,
+                             theta, Rk=Rk, Rmax_mold=self.Rmax_mold, r=self.r)
+        return recon.u_mov, recon.v_mov, recon.u_vg, recon.v_vg
+
+    def _errors(self, components, c1, c2):
+        """
+        功能：计算均方根误差，c1，c2可以是数组（广播），结果的shape与c1，c2广播后相同
+        """
+        u_mov, v_mov, u_vg, v_vg = components
+        c1 = np.asarray(c1, dtype=float)[..., None]
+        c2 = np.asarray(c2, dtype=float)[..., None]
+        wind_x = c1 * u_mov - c2 * u_vg
+        wind_y = c1 * v_mov + c2 * v_vg
+        if self.metric == 'speed':
+            diff2 = (np.sqrt(wind_x ** 2 + wind_y ** 2) - self.wind_spd) ** 2
+        else:
+            diff2 = (wind_x - self.obs_u) ** 2 + (wind_y - self.obs_v) ** 2
+        # 台风中心正好落在站点上时梯度风没有定义，不参与计算
+        return np.sqrt(np.nanmean(diff2, axis=-1))
+
+    def error(self, Rk=40, theta=20, c1=0.8, c2=0.8):
+        """
+        功能：一组参数的均方根误差（m/s）
+        """
+        return float(self._errors(self.components(Rk, theta), c1, c2))
+
+    def model_wind(self, Rk=40, theta=20, c1=0.8, c2=0.8):
+        """
+        功能：一组参数在所有观测上的模型风场
+        :return: PassiveStore，包括time，station，uwnd，vwnd，wind_spd，以及对应的观测obs_u，obs_v，obs_spd
+        """
+        u_mov, v_mov, u_vg, v_vg = self.components(Rk, theta)
+        result = PassiveStore()
+        setattr(result, 'time', self.time)
+        setattr(result, 'station', self.station)
+        setattr(result, 'uwnd', c1 * u_mov - c2 * u_vg)
+        setattr(result, 'vwnd', c1 * v_mov + c2 * v_vg)
+        setattr(result, 'wind_spd', np.sqrt(result.uwnd ** 2 + result.vwnd ** 2))
+        setattr(result, 'obs_u', self.obs_u)
+        setattr(result, 'obs_v', self.obs_v)
+        setattr(result, 'obs_spd', self.wind_spd)
+        return result
+
+    def error_surface(self, Rk, theta, c1, c2):
+        """
+        功能：计算参数网格上的误差面
+        :param Rk: Rk的取值，一维
+        :param theta: theta的取值，一维
+        :param c1: c1的取值，一维
+        :param c2: c2的取值，一维
+        :return: 均方根误差，shape（len(Rk)，len(theta)，len(c1)，len(c2)）
+        """
+        C1, C2 = np.meshgrid(c1, c2, indexing='ij')
+        surface = np.empty([len(Rk), len(theta), len(c1), len(c2)])
+        for i, iRk in enumerate(Rk):
+            for j, jtheta in enumerate(theta):
+                surface[i, j] = self._errors(self.components(iRk, jtheta), C1, C2)
+        return surface
+
+    def calibrate(self, Rk=np.arange(20, 65, 5), theta=np.arange(0, 45, 5),
+                  c1=np.arange(0.3, 1.25, 0.1), c2=np.arange(0.3, 1.25, 0.1),
+                  refine=True):
+        """
+        功能：先在参数网格上计算误差面，再从最优的网格点出发用Nelder-Mead细化
+        :param Rk: Rk的取值，一维
+        :param theta: theta的取值，一维
+        :param c1: c1的取值，一维
+        :param c2: c2的取值，一维
+        :param refine: 是否在网格最优点附近细化
+        :return: PassiveStore，包括best（最优参数的dict），error（最优参数的均方根误差），
+                 surface（误差面），axes（误差面每一维的取值），n_obs（参与率定的观测个数）
+        """
+        axes = {'Rk': np.asarray(Rk, dtype=float),
+                'theta': np.asarray(theta, dtype=float),
+                'c1': np.asarray(c1, dtype=float),
+                'c2': np.asarray(c2, dtype=float)}
+        surface = self.error_surface(axes['Rk'], axes['theta'], axes['c1'],
+                                     axes['c2'])
+        index = np.unravel_index(np.nanargmin(surface), surface.shape)
+        best = {name: float(axes[name][i]) for name, i in zip(axes, index)}
+        error = float(surface[index])
+        if refine:
+            names = list(axes)
+            result = minimize(lambda x: self.error(*x), [best[name] for name in names],
+                              method='Nelder-Mead')
+            if result.fun < error:
+                best = dict(zip(names, map(float, result.x)))
+                error = float(result.fun)
+        calibration = PassiveStore()
+        setattr(calibration, 'best', best)
+        setattr(calibration, 'error', error)
+        setattr(calibration, 'surface', surface)
+        setattr(calibration, 'axes', axes)
+        setattr(calibration, 'n_obs', len(self.time))
+        return calibration
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+# __NAME__   = reconstructe_sweep.py
+# __AUTHOR__ = 'QIU ZHOU'
+# __TIME__   = 2019/8/28 10:20
+
+import os
+import itertools
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+import pandas as pd
+from .fvcom_prep import FvcomPrep
+from .reconstructe_wind import TrackReconstructe
+
+# 子进程中的共享数据：路径和共享内存中的网格坐标、台风距离
+_worker_state = {}
+
+# TrackReconstructe构造时的参数，其余参数（c1，c2）用于合成风场
+ENGINE_PARAMETERS = ['P1', 'theta', 'Rmax', 'Rk', 'Rmax_mold', 'press_mold',
+                     'move_mold']
+
+
+def parameter_grid(**parameters):
+    """
+    功能：生成参数的所有组合
+    例如：parameter_grid(Rk=[30, 40, 50], theta=[15, 20], c1=[0.5, 0.8], c2=[0.8, 0.9], Rmax_mold=[1, 2])
+    :param parameters: 参数名对应取值的list
+    :return: list，每个元素是一组参数的dict
+    """
+    names = list(parameters)
+    return [dict(zip(names, values))
+            for values in itertools.product(*[parameters[name] for name in names])]
+
+
+def _init_worker(track, shm_specs):
+    """
+    功能：子进程初始化，路径只在每个子进程启动时传一次，网格坐标和台风距离通过共享内存访问
+    """
+    _worker_state['track'] = track
+    _worker_state['shm'] = []
+    for name, (shm_name, shape, dtype) in shm_specs.items():
+        shm = shared_memory.SharedMemory(name=shm_name)
+        _worker_state['shm'].append(shm)
+        _worker_state[name] = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+
+def _run_member(member, parameters, ncfile, chunk_size, ncopts):
+    """
+    功能：子进程中重构一个成员的气压场和风场，并逐块写入nc文件
+    :return: member, 运行时间（秒）
+    """
+    t_start = datetime.now()
+    grid = FvcomPrep()
+    for name in ['lon', 'lat', 'lonc', 'latc', 'nv']:
+        setattr(grid, name, _worker_state[name])
+    grid.node, grid.nele = len(grid.lon), len(grid.lonc)
+    engine_kwargs = {name: parameters[name] for name in ENGINE_PARAMETERS
+                     if name in parameters}
+    engine = TrackReconstructe(_worker_state['track'], grid.lon, grid.lat,
+                               grid.lonc, grid.latc,
+                               node_distance=_worker_state['node_distance'],
+                               elem_distance=_worker_state['elem_distance'],
+                               **engine_kwargs)
+    grid.write_surface_forcing_chunks(
+        ncfile, engine.iter_forcing(c1=parameters.get('c1', 0.8),
+                                    c2=parameters.get('c2', 0.8),
+                                    chunk_size=chunk_size), **ncopts)
+    return member, (datetime.now() - t_start).total_seconds()
+
+
+class ReconstructeSweep(object):
+    """
+    功能：对台风重构的参数（Rk，theta，c1，c2，Rmax_mold等）做集合试验
+    网格坐标和每个路径时刻的台风距离只计算一次，放在共享内存中，各个子进程直接读取，不复制
+    """
+
+    def __init__(self, track, grid, output_dir, casename='member'):
+        """
+        参数
+        :param track: 台风路径数据类，包括tp_time，tp_lon，tp_lat，tp_press，tp_vmax（可以先用interp_track插值到逐时）
+        :param grid: 包括lon，lat，lonc，latc，nv的Grid（例如FvcomPrep）
+        :param output_dir: 输出目录，每个成员一个nc文件，以及summary.csv
+        :param casename: 输出文件名的前缀
+        """
+        self.track = track
+        self.grid = grid
+        self.output_dir = output_dir
+        self.casename = casename
+
+    def run(self, members, workers=None, chunk_size=24, **kwargs):
+        """
+        功能：并行计算所有成员，每个成员的强迫写入单独的nc文件
+        注意：Windows下调用的脚本需要放在 if __name__ == '__main__': 中
+        :param members: list，每个元素是一组参数的dict（例如parameter_grid的结果），
+                        可以包括ENGINE_PARAMETERS中的参数以及c1，c2
+        :param workers: 进程数，None表示cpu个数
+        :param chunk_size: 每个成员逐块写入的时刻数
+        :param kwargs: 输出格式和压缩的设置，参考FvcomPrep.surface_forcing_ncopts
+        :return: summary: DataFrame，每个成员的参数、输出文件和运行时间，同时保存为summary.csv
+        """
+        os.makedirs(self.output_dir, exist_ok=True)
+        engine = TrackReconstructe(self.track, self.grid.lon, self.grid.lat,
+                                   self.grid.lonc, self.grid.latc)
+        shape_node = (len(engine.time), len(engine.lon))
+        shape_elem = (len(engine.time), len(engine.lonc))
+        arrays = {'lon': (engine.lon, None), 'lat': (engine.lat, None),
+                  'lonc': (engine.lonc, None), 'latc': (engine.latc, None),
+                  'nv': (np.asarray(self.grid.nv), None),
+                  'node_distance': (None, shape_node),
+                  'elem_distance': (None, shape_elem)}
+        shms = {}
+        shm_specs = {}
+        shared = {}
+        try:
+            for name, (array, shape) in arrays.items():
+                dtype = float if array is None else array.dtype
+                shape = array.shape if array is not None else shape
+                nbytes = max(int(np.prod(shape)) * np.dtype(dtype).itemsize, 1)
+                shms[name] = shared_memory.SharedMemory(create=True, size=nbytes)
+                shared[name] = np.ndarray(shape, dtype=dtype, buffer=shms[name].buf)
+                if array is not None:
+                    shared[name][:] = array
+                shm_specs[name] = (shms[name].name, shape, dtype)
+            engine.storm_distance(engine.lon, engine.lat, out=shared['node_distance'])
+            engine.storm_distance(engine.lonc, engine.latc, out=shared['elem_distance'])
+
+            files = [os.path.join(self.output_dir, '{}_{:03d}.nc'.format(self.casename, i))
+                     for i in range(len(members))]
+            seconds = [None] * len(members)
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                     initargs=(self.track, shm_specs)) as pool:
+                jobs = [pool.submit(_run_member, i, members[i], files[i],
+                                    chunk_size, kwargs)
+                        for i in range(len(members))]
+                for job in jobs:
+                    member, seconds[member] = job.result()
+        finally:
+            shared.clear()
+            for shm in shms.values():
+                shm.close()
+                shm.unlink()
+        summary = pd.DataFrame(members)
+        summary.insert(0, 'member', np.arange(len(members)))
+        summary['file'] = files
+        summary['seconds'] = seconds
+        summary.to_csv(os.path.join(self.output_dir, 'summary.csv'), index=False)
+        return summary
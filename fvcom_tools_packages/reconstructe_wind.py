@@ -4,15 +4,18 @@
 # __AUTHOR__ = 'QIU ZHOU'
 # __TIME__   = 2019/6/18 14:30
 
+import copy
 import numpy as np
-from .utily import distance_on_sphere
+from scipy.interpolate import CubicSpline
+from .utily import PassiveStore, distance_on_sphere
+from .interp_weights import interp_in_time
 
 
 class Reconstructe(object):
 
     def __init__(self, lon, lat, lonc, latc, Pc, P1, Vmax,
                  lonc_af, latc_af, dt, theta, Rmax=None, Rk=40,
-                 Rmax_mold=1, press_mold=1, move_mold=1):
+                 Rmax_mold=1, press_mold=1, move_mold=1, r=None):
         """
         功能：重构气压场和风场
         :param lon: 所求点的经度，可接受array
@@ -31,6 +34,7 @@ class Reconstructe(object):
         :param Rmax_mold: 计算最大风速半径的不同方法, 具体值请参考方法calculate_Rmax()注释
         :param press_mold: 计算气压场的不同方法, 具体值请参考方法air_pressure_field()注释
         :param move_mold: 计算移动风场的不同方法, 具体值请参考方法move_windfield()注释
+        :param r: 所求点到台风中心的距离（m），None表示在这里计算，已经算过（例如空间索引查询时）可以直接传入
         """
         self.lon = lon
         self.lat = lat
@@ -53,7 +57,9 @@ class Reconstructe(object):
         self.r_earth = 6371004    # 地球半径 m
         self.omega = 7.292115e-5  # 地球自转角速度 rad/s
         self.f = 2 * self.omega * np.deg2rad(self.lat) # 科氏参数
-        self.r = distance_on_sphere(self.lon, self.lat, self.lonc, self.latc)   # 所求点到台风中心的距离
+        if r is None:
+            r = distance_on_sphere(self.lon, self.lat, self.lonc, self.latc)
+        self.r = r   # 所求点到台风中心的距离
 
         if self.Rmax is None and self.Rmax_mold:
             self._calculate_Rmax()
@@ -136,3 +142,316 @@ class Reconstructe(object):
         wind = np.sqrt(wind_x ** 2 + wind_y ** 2)
         return wind_x, wind_y, wind
 
+
+
+class TrackReconstructe(object):
+
+    def __init__(self, track, lon, lat, lonc, latc, P1=1013.25, theta=20,
+                 Rmax=None, Rk=40, Rmax_mold=1, press_mold=1, move_mold=1,
+                 time_chunk=8, point_chunk=16384, node_distance=None,
+                 elem_distance=None):
+        """
+        功能：对整条台风路径重构气压场和风场，气压在网格点上，风场在网格中心上
+        所有路径时刻一起计算（广播），按（时刻，点）分块写入预先分配的数组，每块的临时数组可以放进缓存
+        :param track: 台风路径数据类，包括tp_time，tp_lon，tp_lat，tp_press，tp_vmax（例如ReadData(types='ch').data）
+        :param lon: 网格点经度，用于气压场
+        :param lat: 网格点纬度
+        :param lonc: 网格中心经度，用于风场
+        :param latc: 网格中心纬度
+        :param P1: 距离台风中心无限远处的气压，hpa
+        :param theta: 台风入流角
+        :param Rmax: 台风最大风速半径（m），标量或每个路径点一个值，None表示通过Reconstructe计算
+        :param Rk: 计算台风最大风速半径的经验系数，参考Reconstructe
+        :param Rmax_mold: 参考Reconstructe
+        :param press_mold: 参考Reconstructe
+        :param move_mold: 参考Reconstructe
+        :param time_chunk: 每块的路径时刻数
+        :param point_chunk: 每块的点数
+        :param node_distance: 预先算好的网格点到各路径点台风中心的距离（time，node），None表示分块时计算，参考storm_distance
+        :param elem_distance: 预先算好的网格中心到台风中心的距离（time，nele）
+        """
+        self.time = np.asarray(track.tp_time, dtype=float)
+        self.tp_lon = np.asarray(track.tp_lon, dtype=float)
+        self.tp_lat = np.asarray(track.tp_lat, dtype=float)
+        self.tp_press = np.asarray(track.tp_press, dtype=float)
+        self.tp_vmax = np.asarray(track.tp_vmax, dtype=float)
+        self.lon = np.asarray(lon, dtype=float)
+        self.lat = np.asarray(lat, dtype=float)
+        self.lonc = np.asarray(lonc, dtype=float)
+        self.latc = np.asarray(latc, dtype=float)
+        self.P1 = P1
+        self.theta = theta
+        self.Rmax = None if Rmax is None else \
+            np.broadcast_to(np.asarray(Rmax, dtype=float), self.time.shape)
+        self.Rk = Rk
+        self.Rmax_mold = Rmax_mold
+        self.press_mold = press_mold
+        self.move_mold = move_mold
+        self.time_chunk = time_chunk
+        self.point_chunk = point_chunk
+        self.node_distance = node_distance
+        self.elem_distance = elem_distance
+        self.grid = None
+        # 下一个台风中心和时间差（小时），最后一个路径点沿用前一段的移动速度
+        if len(self.time) > 1:
+            self.dt = np.diff(self.time) * 24
+            self.dt = np.append(self.dt, self.dt[-1])
+            self.tp_lon_af = np.append(self.tp_lon[1:],
+                                       2 * self.tp_lon[-1] - self.tp_lon[-2])
+            self.tp_lat_af = np.append(self.tp_lat[1:],
+                                       2 * self.tp_lat[-1] - self.tp_lat[-2])
+        else:
+            self.dt = np.full(1, 6.0)
+            self.tp_lon_af = self.tp_lon.copy()
+            self.tp_lat_af = self.tp_lat.copy()
+
+    @classmethod
+    def from_grid(cls, track, grid, **kwargs):
+        """
+        功能：用网格（Grid，或者读取了fvcom nc文件的ReadData）构造，可以使用网格的空间索引（iter_sparse）
+        :param track: 台风路径数据类，参考__init__
+        :param grid: 包括lon，lat，lonc，latc的Grid
+        :param kwargs: 参考__init__
+        :return: TrackReconstructe
+        """
+        engine = cls(track, grid.lon, grid.lat, grid.lonc, grid.latc, **kwargs)
+        engine.grid = grid
+        return engine
+
+    def iter_sparse(self, radius, c1=0.8, c2=0.8):
+        """
+        功能：只计算台风中心影响半径以内的点，逐个路径时刻返回稀疏的（下标，值）
+        点通过网格的空间索引查询，每个时刻的计算量只与台风影响范围有关，与网格大小无关
+        例如：for update in engine.iter_sparse(500e3): slp[it, update.node_index] = update.slp
+        :param radius: 影响半径，单位为米
+        :param c1: 经验参数，参考Reconstructe.synthesis_windfield
+        :param c2: 经验参数
+        :return: 生成器，每次返回一个PassiveStore，包括time，node_index，node_distance，slp（Pa），
+                 elem_index，elem_distance，uwnd，vwnd（距离单位为米）
+        """
+        if self.grid is None:
+            raise ValueError('iter_sparse需要网格的空间索引，请用TrackReconstructe.from_grid构造')
+        for it in range(len(self.time)):
+            args = (self.tp_lon[it], self.tp_lat[it], self.tp_press[it],
+                    self.P1, self.tp_vmax[it], self.tp_lon_af[it],
+                    self.tp_lat_af[it], self.dt[it], self.theta)
+            kwargs = {'Rmax': None if self.Rmax is None else self.Rmax[it],
+                      'Rk': self.Rk, 'Rmax_mold': self.Rmax_mold}
+            update = PassiveStore()
+            setattr(update, 'time', self.time[it])
+            # 气压，网格点
+            node_index, r = self.grid.find_points_within(
+                self.tp_lon[it], self.tp_lat[it], radius, return_distance=True)
+            recon = Reconstructe(self.lon[node_index], self.lat[node_index],
+                                 *args, press_mold=self.press_mold,
+                                 move_mold=0, r=r, **kwargs)
+            setattr(update, 'node_index', node_index)
+            setattr(update, 'node_distance', r)
+            setattr(update, 'slp', (recon.Pr * 100).astype('f'))
+            # 风场，网格中心
+            elem_index, r = self.grid.find_points_within(
+                self.tp_lon[it], self.tp_lat[it], radius, var='u',
+                return_distance=True)
+            recon = Reconstructe(self.lonc[elem_index], self.latc[elem_index],
+                                 *args, press_mold=self.press_mold,
+                                 move_mold=self.move_mold, r=r, **kwargs)
+            uwnd, vwnd, _ = recon.synthesis_windfield(c1=c1, c2=c2)
+            setattr(update, 'elem_index', elem_index)
+            setattr(update, 'elem_distance', r)
+            setattr(update, 'uwnd', uwnd.astype('f'))
+            setattr(update, 'vwnd', vwnd.astype('f'))
+            yield update
+
+    def at_times(self, time, method='linear'):
+        """
+        功能：得到路径插值到给定时间后的重构对象（设置和网格不变）
+        台风的移动速度取所在最佳路径段的速度，因此只有一个时刻时也能计算移动风场
+        :param time: 需要插值的时间（matplotlib的时间数字），需要在路径的时间范围以内
+        :param method: 路径插值方法，参考interp_track
+        :return: TrackReconstructe
+        """
+        track = PassiveStore()
+        for name in ['tp_lon', 'tp_lat', 'tp_press', 'tp_vmax']:
+            setattr(track, name, getattr(self, name))
+        setattr(track, 'tp_time', self.time)
+        interped = interp_track(track, time, method=method)
+        engine = copy.copy(self)
+        engine.node_distance = engine.elem_distance = None
+        engine.time = interped.tp_time
+        engine.tp_lon = interped.tp_lon
+        engine.tp_lat = interped.tp_lat
+        engine.tp_press = interped.tp_press
+        engine.tp_vmax = interped.tp_vmax
+        if self.Rmax is not None:
+            engine.Rmax = np.interp(engine.time, self.time, self.Rmax)
+        segment = np.clip(np.searchsorted(self.time, engine.time, side='right') - 1,
+                          0, len(self.time) - 1)
+        engine.dt = self.dt[segment]
+        engine.tp_lon_af = engine.tp_lon + self.tp_lon_af[segment] - self.tp_lon[segment]
+        engine.tp_lat_af = engine.tp_lat + self.tp_lat_af[segment] - self.tp_lat[segment]
+        return engine
+
+    def _chunks(self, npoints, first=0, last=None):
+        """
+        功能：遍历（时刻，点）的分块，只包括[first, last)的路径时刻
+        """
+        last = len(self.time) if last is None else last
+        for t0 in range(first, last, self.time_chunk):
+            for p0 in range(0, npoints, self.point_chunk):
+                yield slice(t0, min(t0 + self.time_chunk, last)), \
+                    slice(p0, p0 + self.point_chunk)
+
+    def storm_distance(self, lon, lat, out=None):
+        """
+        功能：计算所有点到每个路径时刻台风中心的距离，可以预先算好传给node_distance，elem_distance
+        :param lon: 点的经度
+        :param lat: 点的纬度
+        :param out: 输出数组（例如放在共享内存中），shape（time，n），None表示新建
+        :return: 距离，单位为米，shape（time，n）
+        """
+        lon = np.asarray(lon, dtype=float)
+        lat = np.asarray(lat, dtype=float)
+        if out is None:
+            out = np.empty([len(self.time), len(lon)])
+        for time_slice, point_slice in self._chunks(len(lon)):
+            out[time_slice, point_slice] = distance_on_sphere(
+                lon[None, point_slice], lat[None, point_slice],
+                self.tp_lon[time_slice, None], self.tp_lat[time_slice, None])
+        return out
+
+    def _reconstructe(self, lon, lat, time_slice, press_mold, move_mold,
+                      r=None):
+        """
+        功能：一块路径时刻（列向量）和一块点（行向量）广播后调用Reconstructe
+        """
+        Rmax = None if self.Rmax is None else self.Rmax[time_slice, None]
+        return Reconstructe(lon[None, :], lat[None, :],
+                            self.tp_lon[time_slice, None],
+                            self.tp_lat[time_slice, None],
+                            self.tp_press[time_slice, None], self.P1,
+                            self.tp_vmax[time_slice, None],
+                            self.tp_lon_af[time_slice, None],
+                            self.tp_lat_af[time_slice, None],
+                            self.dt[time_slice, None], self.theta, Rmax=Rmax,
+                            Rk=self.Rk, Rmax_mold=self.Rmax_mold,
+                            press_mold=press_mold, move_mold=move_mold, r=r)
+
+    def pressure_field(self, first=0, last=None):
+        """
+        功能：网格点上的气压场
+        :param first: 起始的路径时刻下标
+        :param last: 结束的路径时刻下标（不包括），None表示到最后
+        :return: slp: shape（time，node），单位为Pa
+        """
+        last = len(self.time) if last is None else last
+        slp = np.empty([last - first, len(self.lon)], dtype='f')
+        for time_slice, point_slice in self._chunks(len(self.lon), first, last):
+            r = None if self.node_distance is None else \
+                self.node_distance[time_slice, point_slice]
+            recon = self._reconstructe(self.lon[point_slice],
+                                       self.lat[point_slice], time_slice,
+                                       self.press_mold, 0, r=r)
+            out_slice = slice(time_slice.start - first, time_slice.stop - first)
+            slp[out_slice, point_slice] = recon.Pr * 100
+        return slp
+
+    def wind_field(self, c1=0.8, c2=0.8, first=0, last=None):
+        """
+        功能：网格中心上的风场
+        :param c1: 经验参数，参考Reconstructe.synthesis_windfield
+        :param c2: 经验参数
+        :param first: 起始的路径时刻下标
+        :param last: 结束的路径时刻下标（不包括），None表示到最后
+        :return: uwnd, vwnd: shape（time，nele）
+        """
+        last = len(self.time) if last is None else last
+        uwnd = np.empty([last - first, len(self.lonc)], dtype='f')
+        vwnd = np.empty([last - first, len(self.lonc)], dtype='f')
+        for time_slice, point_slice in self._chunks(len(self.lonc), first, last):
+            r = None if self.elem_distance is None else \
+                self.elem_distance[time_slice, point_slice]
+            recon = self._reconstructe(self.lonc[point_slice],
+                                       self.latc[point_slice], time_slice,
+                                       self.press_mold, self.move_mold, r=r)
+            out_slice = slice(time_slice.start - first, time_slice.stop - first)
+            uwnd[out_slice, point_slice], vwnd[out_slice, point_slice], _ = \
+                recon.synthesis_windfield(c1=c1, c2=c2)
+        return uwnd, vwnd
+
+    def iter_forcing(self, c1=0.8, c2=0.8, chunk_size=24):
+        """
+        功能：按时间窗口逐块重构气压场和风场，不需要一次生成整个时段
+        例如：prep.write_surface_forcing_chunks(ncfile, engine.iter_forcing(chunk_size=24))
+        :param c1: 经验参数，参考Reconstructe.synthesis_windfield
+        :param c2: 经验参数
+        :param chunk_size: 每块的时刻数
+        :return: 生成器，每次返回一个PassiveStore，包括time，slp，uwnd，vwnd
+        """
+        for first in range(0, len(self.time), chunk_size):
+            last = min(first + chunk_size, len(self.time))
+            forcing_data = PassiveStore()
+            setattr(forcing_data, 'time', self.time[first:last])
+            setattr(forcing_data, 'slp', self.pressure_field(first, last))
+            uwnd, vwnd = self.wind_field(c1=c1, c2=c2, first=first, last=last)
+            setattr(forcing_data, 'uwnd', uwnd)
+            setattr(forcing_data, 'vwnd', vwnd)
+            yield forcing_data
+
+    def reconstructe(self, c1=0.8, c2=0.8):
+        """
+        功能：重构整条路径的气压场和风场
+        :param c1: 经验参数，参考Reconstructe.synthesis_windfield
+        :param c2: 经验参数
+        :return: PassiveStore，包括time，slp（time，node），uwnd，vwnd（time，nele），可以直接用于write_surface_forcing
+        """
+        forcing_data = PassiveStore()
+        setattr(forcing_data, 'time', self.time)
+        setattr(forcing_data, 'slp', self.pressure_field())
+        uwnd, vwnd = self.wind_field(c1=c1, c2=c2)
+        setattr(forcing_data, 'uwnd', uwnd)
+        setattr(forcing_data, 'vwnd', vwnd)
+        return forcing_data
+
+
+def interp_track(track, time, method='linear'):
+    """
+    功能：将台风最佳路径（一般6小时一个点）插值到强迫的时间轴上（例如逐时），所有变量一起插值
+    :param track: 台风路径数据类，包括tp_time，tp_lon，tp_lat，tp_press，tp_vmax
+    :param time: 需要插值的时间（matplotlib的时间数字），需要在路径的时间范围以内
+    :param method: 'linear'为线性插值，'spline'为三次样条插值（路径更平滑）
+    :return: PassiveStore，与track的变量相同，可以直接用于TrackReconstructe
+    """
+    names = ['tp_lon', 'tp_lat', 'tp_press', 'tp_vmax']
+    tp_time = np.asarray(track.tp_time, dtype=float)
+    time = np.asarray(time, dtype=float)
+    values = np.column_stack([np.asarray(getattr(track, name), dtype=float)
+                              for name in names])
+    if method == 'linear':
+        interped = interp_in_time(tp_time, values, time)
+    elif method == 'spline':
+        if np.any(time < tp_time[0]) or np.any(time > tp_time[-1]):
+            raise ValueError('插值时间超出台风路径的时间范围')
+        interped = CubicSpline(tp_time, values, axis=0)(time)
+    else:
+        raise ValueError('不支持的插值方法：{}'.format(method))
+    interped_track = PassiveStore()
+    setattr(interped_track, 'tp_time', time)
+    for i, name in enumerate(names):
+        setattr(interped_track, name, interped[:, i])
+    return interped_track
+
+
+def radial_blend_weight(r, radius_inner, radius_outer):
+    """
+    功能：参数化台风模型的径向权重，radius_inner以内为1，radius_outer以外为0，中间用余弦平滑过渡
+    合成场 = weight * 参数化场 + (1 - weight) * 背景场（例如ERA5）
+    :param r: 到台风中心的距离，单位为米
+    :param radius_inner: 完全使用参数化场的半径，单位为米
+    :param radius_outer: 完全使用背景场的半径，单位为米
+    :return: weight，与r的shape相同
+    """
+    if radius_outer <= radius_inner:
+        raise ValueError('radius_outer需要大于radius_inner')
+    r = np.asarray(r, dtype=float)
+    ratio = np.clip((r - radius_inner) / (radius_outer - radius_inner), 0, 1)
+    return 0.5 * (1 + np.cos(np.pi * ratio))
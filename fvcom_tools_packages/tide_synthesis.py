@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+# __NAME__   = tide_synthesis.py
+# __AUTHOR__ = 'QIU ZHOU'
+# __TIME__   = 2019/8/20 9:30
+
+"""
+    功能：由调和常数（振幅、迟角）合成潮位时间序列，用于生成开边界的水位强迫
+    η(t) = Σ f·A·cos(V0 + u - G)，展开为设计矩阵（time，2C）乘以系数矩阵（2C，nobc）：
+    设计矩阵的列为[f·cos(V0 + u), f·sin(V0 + u)]，系数为[A·cosG; A·sinG]
+    天文参数和交点订正参考Pugh (1987)和Schureman (1958)，迟角为相对格林尼治（UTC）的迟角
+"""
+import numpy as np
+
+# 各分潮的Doodson系数（T，s，h，p）和相位常数（度），V0 = a·T + b·s + c·h + d·p + e
+# T为平太阳时角（180 + 15·UT），s、h、p分别为月球、太阳、月球近地点的平黄经
+CONSTITUENTS = {
+    'M2': (2, -2, 2, 0, 0),
+    'S2': (2, 0, 0, 0, 0),
+    'N2': (2, -3, 2, 1, 0),
+    'K2': (2, 0, 2, 0, 0),
+    '2N2': (2, -4, 2, 2, 0),
+    'MU2': (2, -4, 4, 0, 0),
+    'NU2': (2, -3, 4, -1, 0),
+    'K1': (1, 0, 1, 0, -90),
+    'O1': (1, -2, 1, 0, 90),
+    'P1': (1, 0, -1, 0, 90),
+    'Q1': (1, -3, 1, 1, 90),
+    'M4': (4, -4, 4, 0, 0),
+    'MS4': (4, -2, 2, 0, 0),
+    'MN4': (4, -5, 4, 1, 0),
+    'M6': (6, -6, 6, 0, 0),
+    'Mf': (0, 2, 0, 0, 0),
+    'Mm': (0, 1, 0, -1, 0),
+}
+
+
+def astronomical_arguments(mjd):
+    """
+    功能：计算天文参数
+    :param mjd: 修正儒略日（days since 1858-11-17 00:00:00 UTC）
+    :return: T, s, h, p, N，单位为度
+    """
+    mjd = np.asarray(mjd, dtype=float)
+    t = (mjd - 51544.5) / 36525  # 从J2000开始的儒略世纪数
+    T = 180 + 15 * 24 * (mjd - np.floor(mjd))
+    s = 218.3164591 + 481267.88134236 * t
+    h = 280.4664567 + 36000.76983 * t
+    p = 83.3532430 + 4069.0137111 * t
+    N = 125.0445550 - 1934.1361849 * t
+    return T, s, h, p, N
+
+
+def nodal_corrections(constituents, N):
+    """
+    功能：计算交点订正因子f和交点订正角u
+    :param constituents: 分潮名称，list
+    :param N: 月球升交点平黄经，单位为度，可以是数组
+    :return: f, u: shape（len(N)，C），u的单位为度
+    """
+    N = np.deg2rad(np.atleast_1d(np.asarray(N, dtype=float)))
+    cos1, cos2, cos3 = np.cos(N), np.cos(2 * N), np.cos(3 * N)
+    sin1, sin2, sin3 = np.sin(N), np.sin(2 * N), np.sin(3 * N)
+    one, zero = np.ones_like(N), np.zeros_like(N)
+    f_m2 = 1.0004 - 0.0373 * cos1 + 0.0002 * cos2
+    u_m2 = -2.14 * sin1
+    f_o1 = 1.0089 + 0.1871 * cos1 - 0.0147 * cos2 + 0.0014 * cos3
+    u_o1 = 10.80 * sin1 - 1.34 * sin2 + 0.19 * sin3
+    nodal = {
+        'M2': (f_m2, u_m2),
+        'S2': (one, zero),
+        'N2': (f_m2, u_m2),
+        'K2': (1.0241 + 0.2863 * cos1 + 0.0083 * cos2 - 0.0015 * cos3,
+               -17.74 * sin1 + 0.68 * sin2 - 0.04 * sin3),
+        '2N2': (f_m2, u_m2),
+        'MU2': (f_m2, u_m2),
+        'NU2': (f_m2, u_m2),
+        'K1': (1.0060 + 0.1150 * cos1 - 0.0088 * cos2 + 0.0006 * cos3,
+               -8.86 * sin1 + 0.68 * sin2 - 0.07 * sin3),
+        'O1': (f_o1, u_o1),
+        'P1': (one, zero),
+        'Q1': (f_o1, u_o1),
+        'M4': (f_m2 ** 2, 2 * u_m2),
+        'MS4': (f_m2, u_m2),
+        'MN4': (f_m2 ** 2, 2 * u_m2),
+        'M6': (f_m2 ** 3, 3 * u_m2),
+        'Mf': (1.043 + 0.414 * cos1, -23.7 * sin1 + 2.7 * sin2 - 0.4 * sin3),
+        'Mm': (1.000 - 0.130 * cos1, zero),
+    }
+    f = np.column_stack([nodal[name][0] for name in constituents])
+    u = np.column_stack([nodal[name][1] for name in constituents])
+    return f, u
+
+
+def design_matrix(mjd, constituents, nodal=True):
+    """
+    功能：构造调和合成的设计矩阵
+    :param mjd: 修正儒略日，一维
+    :param constituents: 分潮名称，list
+    :param nodal: 是否做交点订正
+    :return: shape（time，2C），前C列为f·cos(V0 + u)，后C列为f·sin(V0 + u)
+    """
+    unknown = [name for name in constituents if name not in CONSTITUENTS]
+    if unknown:
+        raise ValueError('不支持的分潮：{}'.format(unknown))
+    T, s, h, p, N = astronomical_arguments(np.atleast_1d(mjd))
+    doodson = np.array([CONSTITUENTS[name] for name in constituents], dtype=float)
+    arguments = np.column_stack([T, s, h, p, np.ones_like(T)])
+    theta = arguments @ doodson.T
+    if nodal:
+        f, u = nodal_corrections(constituents, N)
+        theta += u
+    else:
+        f = 1.0
+    theta = np.deg2rad(np.mod(theta, 360))
+    return np.hstack([f * np.cos(theta), f * np.sin(theta)])
+
+
+def tidal_coefficients(amplitude, phase):
+    """
+    功能：将振幅和迟角转为设计矩阵对应的系数
+    :param amplitude: 振幅，shape（C，n）
+    :param phase: 格林尼治迟角，单位为度，shape（C，n）
+    :return: shape（2C，n）
+    """
+    amplitude = np.asarray(amplitude, dtype=float)
+    phase = np.deg2rad(np.asarray(phase, dtype=float))
+    return np.vstack([amplitude * np.cos(phase), amplitude * np.sin(phase)])
+
+
+def synthesize_tide(mjd, constituents, amplitude, phase, nodal=True, z0=0.0):
+    """
+    功能：合成潮位时间序列，所有点一起计算（一次矩阵乘法）
+    :param mjd: 修正儒略日，一维
+    :param constituents: 分潮名称，list
+    :param amplitude: 振幅，shape（C，n）
+    :param phase: 格林尼治迟角，单位为度，shape（C，n）
+    :param nodal: 是否做交点订正
+    :param z0: 平均水位
+    :return: shape（time，n）
+    """
+    return design_matrix(mjd, constituents, nodal) @ \
+        tidal_coefficients(amplitude, phase) + z0
@@ -13,6 +13,17 @@ class PassiveStore(object):
     def __iter__(self):
         return (a for a in self.__dict__.keys() if not a.startswith('_'))
 
+def merge_stores(*stores):
+    """
+    功能：把多个PassiveStore的属性合并成一个（同名属性以后面的为准）
+    :param stores: PassiveStore
+    :return: merged: PassiveStore
+    """
+    merged = PassiveStore()
+    for store in stores:
+        merged.__dict__.update(store.__dict__)
+    return merged
+
 def find_same_index(data):
     if isinstance(data, list):
         x = data
@@ -46,3 +57,27 @@ def distance_on_sphere(lon1, lat1, lon2, lat2):
     return distance
 
 
+def lonlat_to_xyz(lon, lat):
+    """
+    功能：将经纬度转化为单位球面上的三维坐标，用于空间索引（弦长与球面距离单调对应）
+    :param lon: 经度
+    :param lat: 纬度
+    :return: xyz: shape（n，3）
+    """
+    radlon, radlat = map(np.deg2rad, [np.asarray(lon, dtype=float).ravel(),
+                                      np.asarray(lat, dtype=float).ravel()])
+    xyz = np.empty([len(radlon), 3])
+    xyz[:, 0] = np.cos(radlat) * np.cos(radlon)
+    xyz[:, 1] = np.cos(radlat) * np.sin(radlon)
+    xyz[:, 2] = np.sin(radlat)
+    return xyz
+
+
+def inverse_barometer(slp, p_ref=101325.0):
+    """
+    功能：计算逆气压效应引起的水位变化（气压每升高1hPa，水位下降约9.948mm）
+    :param slp: 海平面气压，单位为Pa
+    :param p_ref: 参考气压，单位为Pa
+    :return: 水位变化，单位为米
+    """
+    return -9.948 * (np.asarray(slp) - p_ref) * 0.01 * 0.001